@@ -1,12 +1,36 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Optional
-import joblib       # loads your trained ML model
+from typing import Dict, List, Optional
+import asyncio
+import bisect
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import threading
+import time
+import numpy as np
 import pandas as pd
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 
+# Shared pipeline code (model loading, feature schema) lives in src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from model_registry import ModelRegistry
+import instrumentation
+from feature_store import FEATURE_STORE_DIR, partition_path, read_table
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    load_model_on_startup()
+    yield
+
+
 # Create the FastAPI app
-app = FastAPI(title="Apnea Alert API")
+app = FastAPI(title="Apnea Alert API", lifespan=lifespan)
 
 # Add CORS middleware to allow frontend requests
 origins = [
@@ -22,18 +46,140 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load model and alerts once on startup
-xgb_model = joblib.load('models/xgboost_balanced_model.pkl')
-alerts_df = pd.read_csv('data/consolidated_xgboost_alerts.csv')
+# The model is served from the registry (models/registry/xgboost_balanced/CURRENT), falling back
+# to the legacy pickle. It is loaded in the startup hook, not at import, and newly published
+# versions are picked up on the next request without restarting the workers.
+model_registry = ModelRegistry('xgboost_balanced', fallback_path='models/xgboost_balanced_model.pkl')
 
-# Expected feature columns in exact training order
-expected_features = [
+# Feature order used when the model artifact carries no schema
+DEFAULT_FEATURES = [
     'mean', 'std', 'min', 'max', 'median',
     'skewness', 'kurtosis',
     'power_vlf', 'power_lf', 'power_hf',
     'app_entropy', 'sample_entropy'
 ]
 
+label_map = {0: "Normal", 1: "Pre-apnea Warning", 2: "Apnea"}
+
+# Concurrent /predict calls arriving within this window are scored together
+PREDICT_BATCH_WINDOW_MS = 5
+PREDICT_MAX_BATCH = 256
+
+# Set when running several workers (uvicorn --workers N): the alert index and the request counters
+# then live in memory-mapped files in this directory, shared by all workers instead of copied.
+# The model itself stays per worker: the registry's native booster is small next to the alerts.
+API_SHARED_DIR = os.environ.get('API_SHARED_DIR')
+if API_SHARED_DIR:
+    os.makedirs(API_SHARED_DIR, exist_ok=True)
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    import fcntl  # POSIX only; shared mode is for multi-worker Linux deployments
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+MAX_WORKERS = 64
+WORKER_STATS_DTYPE = np.dtype([
+    ('pid', 'i8'), ('started', 'f8'), ('requests', 'i8'), ('errors', 'i8'),
+    ('latency_sum_s', 'f8'), ('latency_max_s', 'f8')
+])
+
+
+def pid_alive(pid):
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class WorkerStats:
+    """
+    Per-worker request and latency counters. With shared_dir, every worker owns one slot of a
+    memory-mapped table there, so any worker can report all of them; each slot has a single
+    writer, so counting needs no lock. Without it, the table only holds this process.
+    """
+    def __init__(self, shared_dir=None, max_workers=MAX_WORKERS):
+        self.shared_dir = shared_dir
+        self.max_workers = max_workers
+        self.pid = None
+        self.slot = 0
+        self.table = None
+
+    def attach(self):
+        # Called from the startup hook (and again if the process was forked since), never at import
+        if self.shared_dir is None:
+            self.table = np.zeros(1, dtype=WORKER_STATS_DTYPE)
+            self.slot = 0
+            self.table[0] = (os.getpid(), time.time(), 0, 0, 0.0, 0.0)
+        else:
+            path = os.path.join(self.shared_dir, 'workers.dat')
+            with file_lock(os.path.join(self.shared_dir, 'workers.lock')):
+                if not os.path.exists(path):
+                    np.zeros(self.max_workers, dtype=WORKER_STATS_DTYPE).tofile(path)
+                self.table = np.memmap(path, dtype=WORKER_STATS_DTYPE, mode='r+', shape=(self.max_workers,))
+                free = [i for i, pid in enumerate(self.table['pid']) if pid == 0 or not pid_alive(pid)]
+                if not free:
+                    raise RuntimeError(f"All {self.max_workers} worker stat slots are in use")
+                self.slot = free[0]
+                self.table[self.slot] = (os.getpid(), time.time(), 0, 0, 0.0, 0.0)
+                self.table.flush()
+        self.pid = os.getpid()
+
+    def record(self, latency_s, error=False):
+        if self.pid != os.getpid():
+            self.attach()
+        row = self.table[self.slot:self.slot + 1]
+        row['requests'] += 1
+        row['errors'] += int(error)
+        row['latency_sum_s'] += latency_s
+        row['latency_max_s'] = max(row['latency_max_s'][0], latency_s)
+
+    def snapshot(self):
+        if self.pid != os.getpid():
+            self.attach()
+        now = time.time()
+        return [
+            {
+                "pid": int(r['pid']),
+                "uptime_s": round(now - r['started'], 1),
+                "requests": int(r['requests']),
+                "errors": int(r['errors']),
+                "mean_latency_ms": round(1000 * r['latency_sum_s'] / r['requests'], 3) if r['requests'] else None,
+                "max_latency_ms": round(1000 * r['latency_max_s'], 3)
+            }
+            for r in self.table if r['pid'] != 0 and pid_alive(r['pid'])
+        ]
+
+
+worker_stats = WorkerStats(API_SHARED_DIR)
+
+
+@app.middleware("http")
+async def count_requests(request: Request, call_next):
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        worker_stats.record(time.perf_counter() - start, error=True)
+        raise
+    elapsed = time.perf_counter() - start
+    worker_stats.record(elapsed, error=response.status_code >= 500)
+    if instrumentation.enabled():
+        # Label by route template (/alerts/stream, not the query string) to keep series bounded
+        route = getattr(request.scope.get('route'), 'path', 'unmatched')
+        instrumentation.observe('apnea_http_request_seconds', elapsed, route=route, method=request.method)
+        instrumentation.count('apnea_http_responses_total', route=route, status=response.status_code)
+    return response
+
 
 # Root route (just for testing)
 @app.get("/")
@@ -46,6 +192,47 @@ def health_check():
     return {"status": "OK"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    # Metrics of the worker that answers; enable with APNEA_METRICS=1
+    return PlainTextResponse(instrumentation.metrics.prometheus_text(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/workers")
+def worker_status():
+    return {"worker": os.getpid(), "workers": worker_stats.snapshot()}
+
+
+def load_model_on_startup():
+    worker_stats.attach()
+    # A missing model must not stop the API from serving alerts; /predict answers 503 until it exists
+    try:
+        model_registry.load()
+    except Exception as e:
+        print(f"Model not loaded at startup: {e}")
+
+
+def get_predictor():
+    try:
+        return model_registry.get()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Model unavailable: {e}")
+
+
+@app.get("/model")
+def model_status():
+    return model_registry.status()
+
+
+@app.post("/model/reload")
+def reload_model():
+    try:
+        model_registry.load()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Model unavailable: {e}")
+    return model_registry.status()
+
+
 
 # Dummy users (replace later with DB check)
 users_db = {
@@ -69,38 +256,494 @@ def login(request: LoginRequest):
 
 class NamedFeatureRequest(BaseModel):
     features: Dict[str, float]
-    
 
-# Prediction endpoint
-@app.post("/predict")
-def predict_apnea_named(feature_request: NamedFeatureRequest):
-    input_features = feature_request.features
-    # Check for missing features
-    missing = [f for f in expected_features if f not in input_features]
+
+class BatchFeatureRequest(BaseModel):
+    features: List[Dict[str, float]]
+
+
+def expected_features(predictor):
+    # Exact training order, from the served model's feature schema
+    return predictor.feature_names or DEFAULT_FEATURES
+
+
+def feature_row(input_features, predictor):
+    # Check for missing features, then order values as in training
+    features = expected_features(predictor)
+    missing = [f for f in features if f not in input_features]
     if missing:
-        raise HTTPException(status_code=400, detail=f"Missing features: {missing}")
+        raise ValueError(f"Missing features: {missing}")
+    return [input_features[f] for f in features]
+
+
+def score_matrix(X, predictor):
+    # One booster pass gives both the label and its probability
+    labels, proba = predictor.predict(X)
+    return [
+        {"prediction": label_map[int(label)], "confidence": float(p.max())}
+        for label, p in zip(labels, proba)
+    ]
 
-    # Construct DataFrame in correct column order
-    feature_values = [input_features[f] for f in expected_features]
-    features_df = pd.DataFrame([feature_values], columns=expected_features)
 
+class PredictionCoalescer:
+    """
+    Collects single-row predictions from concurrent requests for a few milliseconds
+    and scores them as one matrix, so the booster runs once per batch instead of per call.
+    """
+    def __init__(self, window_ms=PREDICT_BATCH_WINDOW_MS, max_batch=PREDICT_MAX_BATCH):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue = None
+        self._worker = None
+
+    def _ensure_worker(self):
+        # Started lazily on the serving event loop (and restarted if that loop changes)
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, row, predictor):
+        # Rows are grouped per model version, so a hot reload never mixes feature orders in a batch
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((row, predictor, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            if self._queue.qsize() < self.max_batch - 1:
+                await asyncio.sleep(self.window)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            groups = {}
+            for item in batch:
+                groups.setdefault(id(item[1]), []).append(item)
+            for group in groups.values():
+                await self._score(loop, group)
+
+    async def _score(self, loop, group):
+        X = np.asarray([row for row, _, _ in group], dtype=np.float32)
+        try:
+            results = await loop.run_in_executor(None, score_matrix, X, group[0][1])
+        except Exception as e:
+            for _, _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), result in zip(group, results):
+            if not future.done():
+                future.set_result(result)
+
+
+predict_coalescer = PredictionCoalescer()
+
+
+# Prediction endpoint
+@app.post("/predict")
+async def predict_apnea_named(feature_request: NamedFeatureRequest):
+    # The registry check may touch the filesystem or load a new version: keep it off the event loop
+    predictor = await run_in_threadpool(get_predictor)
     try:
-        preds = xgb_model.predict(features_df)[0]
-        proba = xgb_model.predict_proba(features_df).max()  # probabilities for each class
-        label_map = {0: "Normal", 1: "Pre-apnea Warning", 2: "Apnea"}
-        return {"prediction": label_map[preds], "confidence": float(proba)}
+        row = feature_row(feature_request.features, predictor)
+        return await predict_coalescer.submit(row, predictor)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+
+@app.post("/predict/batch")
+def predict_apnea_batch(batch_request: BatchFeatureRequest):
+    predictor = get_predictor()
+    rows = []
+    for i, input_features in enumerate(batch_request.features):
+        try:
+            rows.append(feature_row(input_features, predictor))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Item {i}: {e}")
+    if not rows:
+        return {"predictions": []}
+
+    try:
+        return {"predictions": score_matrix(np.asarray(rows, dtype=np.float32), predictor)}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+
+# Sequence-aware scoring with the LSTM; torch is imported when a sequence endpoint is first used.
+# Sessions (one per monitored patient) live in the worker that served them, so with several
+# workers a patient's epochs must be routed to the same worker.
+LSTM_MODEL_PATH = os.environ.get('LSTM_MODEL_PATH', 'models/lstm_improved_apnea_model.pth')
+# Bounds on the sessions one worker keeps: least recently stepped are dropped past the cap,
+# and sessions idle for longer than the TTL are dropped on the next step
+LSTM_MAX_SESSIONS = int(os.environ.get('LSTM_MAX_SESSIONS', 10_000))
+LSTM_SESSION_TTL_S = float(os.environ.get('LSTM_SESSION_TTL_S', 3600))
+lstm_engine = None
+lstm_engine_lock = threading.Lock()
+
+
+def get_lstm_engine():
+    global lstm_engine
+    with lstm_engine_lock:
+        if lstm_engine is None:
+            try:
+                from lstm_inference import LSTMEngine
+                lstm_engine = LSTMEngine.load(LSTM_MODEL_PATH, max_sessions=LSTM_MAX_SESSIONS,
+                                              session_ttl_s=LSTM_SESSION_TTL_S)
+            except Exception as e:
+                raise HTTPException(status_code=503, detail=f"LSTM model unavailable: {e}")
+    return lstm_engine
+
+
+class SequenceStep(BaseModel):
+    session: str
+    features: Dict[str, float]
+
+
+class SequenceRequest(BaseModel):
+    steps: List[SequenceStep]
+
+
+@app.post("/predict/sequence")
+def predict_sequence(sequence_request: SequenceRequest):
+    """
+    Advance each session by its next epoch and score all of them in one LSTM pass. A session
+    without a prediction yet (its first window is not full) gets a null prediction.
+    """
+    engine = get_lstm_engine()
+    rows = []
+    for i, step in enumerate(sequence_request.steps):
+        try:
+            rows.append(feature_row(step.features, engine))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Item {i}: {e}")
+    if not rows:
+        return {"predictions": []}
+
+    sessions = [step.session for step in sequence_request.steps]
+    try:
+        proba = engine.step(sessions, np.asarray(rows, dtype=np.float32))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"predictions": [
+        {"session": session, "prediction": None, "confidence": None} if np.isnan(p).any() else
+        {"session": session, "prediction": label_map[int(p.argmax())], "confidence": float(p.max())}
+        for session, p in zip(sessions, proba)
+    ]}
+
+
+@app.delete("/predict/sequence/{session}")
+def reset_sequence(session: str):
+    get_lstm_engine().reset(session)
+    return {"session": session, "reset": True}
+
+PREDICTIONS_CSV = 'data/combined/features_advanced_predictions.csv'
+ALERT_LABELS = [1, 2]  # Warnings (1) and Apnea (2)
+
+# Alerts come from the record's predictions partition in the feature store. Set API_PREDICTIONS_CSV
+# to follow a CSV that is being appended to instead (e.g. the output of stream_inference.py).
+API_RECORD = os.environ.get('API_RECORD', 'x01')
+API_PREDICTIONS_CSV = os.environ.get('API_PREDICTIONS_CSV')
+
+
+def alert_records(df):
+    # NaN features (e.g. undefined entropy) are not valid JSON
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+class AlertCache:
+    """
+    Keeps the alert rows of the predictions CSV in memory.
+    The file is only touched again when its mtime or size changes; rows appended since the
+    last load are parsed on their own, anything else (truncation, rewrite) triggers a full reload.
+    """
+    def __init__(self, path=PREDICTIONS_CSV, alert_labels=ALERT_LABELS):
+        self.path = path
+        self.alert_labels = alert_labels
+        self.alerts = []
+        self._lock = threading.Lock()
+        self._stat = None
+        self._header = b''
+        self._offset = 0
+        self._tail = b''
+
+    @property
+    def version(self):
+        # Identifies the file contents the alerts were read from, used as the ETag base
+        if self._stat is None:
+            return None
+        return f"{self._stat[1]:x}-{self._stat[0]:x}"
+
+    def _parse(self, data):
+        df = pd.read_csv(io.BytesIO(self._header + data))
+        return alert_records(df[df['predicted_label'].isin(self.alert_labels)])
+
+    def _consume(self, data, start):
+        # Only parse complete lines; a partially written last row is picked up next time
+        end = data.rfind(b'\n') + 1
+        rows = self._parse(data[:end]) if end > 0 else []
+        self._offset = start + end
+        self._tail = (self._header + data[:end])[-64:]
+        return rows
+
+    def _reload(self):
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        header_end = data.find(b'\n') + 1
+        self._header = data[:header_end]
+        self.alerts = self._consume(data[header_end:], header_end) if header_end else []
+
+    def _append(self):
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset - len(self._tail))
+            if f.read(len(self._tail)) != self._tail:
+                return False
+            data = f.read()
+        self.alerts.extend(self._consume(data, self._offset))
+        return True
+
+    def refresh(self):
+        st = os.stat(self.path)
+        stat = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            if stat == self._stat:
+                return
+            if self._stat is None or st.st_size < self._offset or not self._append():
+                self._reload()
+            self._stat = stat
+
+    def read_alert_frame(self):
+        # All complete alert rows, independent of the cached state (used to build shared indexes)
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        df = pd.read_csv(io.BytesIO(data[:data.rfind(b'\n') + 1]))
+        return df[df['predicted_label'].isin(self.alert_labels)]
+
+    def recent(self, limit):
+        with self._lock:
+            # Like the DataFrame.tail this replaced: None means all, zero or less means none
+            if limit is None:
+                return list(self.alerts)
+            return self.alerts[-limit:] if limit > 0 else []
+
+    def latest_epoch(self):
+        with self._lock:
+            return self.alerts[-1]['epoch'] if self.alerts else 0
+
+    def since(self, last_epoch, limit):
+        # Alerts are stored in epoch order, so the ones after last_epoch form a suffix
+        with self._lock:
+            start = bisect.bisect_right(self.alerts, last_epoch, key=lambda a: a['epoch'])
+            return self.alerts[start:start + limit]
+
+
+class StoreAlertCache(AlertCache):
+    """
+    Alert rows of one record's predictions partition in the feature store. Partitions are
+    replaced whole, so a changed file is simply re-read; only alert rows are decoded, the label
+    filter being pushed down into the Parquet scan.
+    """
+    def __init__(self, record=API_RECORD, store_dir=FEATURE_STORE_DIR, alert_labels=ALERT_LABELS):
+        super().__init__(partition_path('predictions', record, store_dir), alert_labels)
+        self.record = record
+        self.store_dir = store_dir
+
+    def read_alert_frame(self):
+        df = read_table('predictions', records=[self.record], store_dir=self.store_dir,
+                        filters=[('predicted_label', 'in', self.alert_labels)])
+        return df.drop(columns=['record']).sort_values('epoch', kind='stable')
+
+    def refresh(self):
+        st = os.stat(self.path)
+        stat = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            if stat == self._stat:
+                return
+            self.alerts = alert_records(self.read_alert_frame())
+            self._stat = stat
+
+
+class SharedAlertIndex:
+    """
+    Alert rows as a memory-mapped structured array shared by all API workers (same interface as
+    AlertCache). When the alert source (predictions partition or CSV) changes, the first worker to notice rebuilds the index
+    under a file lock and points alerts.CURRENT at it; the others just map the new file, so the CSV
+    is read once per change and the rows sit once in the page cache rather than once per worker.
+    Rows are only turned into dicts for the slice a request returns.
+    """
+    def __init__(self, shared_dir, source):
+        self.shared_dir = shared_dir
+        self.source = source
+        self.path = source.path
+        self.version = None
+        self.rows = None
+        self._lock = threading.Lock()
+        self._pointer = os.path.join(shared_dir, 'alerts.CURRENT')
+
+    def _index_path(self, version):
+        return os.path.join(self.shared_dir, f'alerts-{version}.npy')
+
+    def _current(self):
+        try:
+            with open(self._pointer) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _build(self, version):
+        with file_lock(os.path.join(self.shared_dir, 'alerts.lock')):
+            if self._current() == version:
+                return  # another worker got here first
+            df = self.source.read_alert_frame()
+            text_widths = {c: f'U{max(df[c].astype(str).str.len().max() if len(df) else 1, 1)}'
+                           for c in df.columns if not pd.api.types.is_numeric_dtype(df[c])}
+            tmp_path = os.path.join(self.shared_dir, 'alerts.npy.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.save(f, df.to_records(index=False, column_dtypes=text_widths))
+            os.replace(tmp_path, self._index_path(version))
+            with open(self._pointer + '.tmp', 'w') as f:
+                f.write(version)
+            os.replace(self._pointer + '.tmp', self._pointer)
+            # Keep the previous index too: a worker may be about to map it
+            old = sorted(glob.glob(os.path.join(self.shared_dir, 'alerts-*.npy')), key=os.path.getmtime)
+            for stale in old[:-2]:
+                os.remove(stale)
+
+    def refresh(self):
+        st = os.stat(self.path)
+        version = f"{st.st_size:x}-{st.st_mtime_ns:x}"
+        with self._lock:
+            if version == self.version:
+                return
+            if self._current() != version:
+                self._build(version)
+            current = self._current()
+            self.rows = np.load(self._index_path(current), mmap_mode='r')
+            self.version = current
+
+    def _records(self, rows):
+        return alert_records(pd.DataFrame(rows)) if len(rows) else []
+
+    def recent(self, limit):
+        rows = self.rows if self.rows is not None else []
+        if limit is None:
+            return self._records(rows)
+        return self._records(rows[-limit:] if limit > 0 else rows[:0])
+
+    def latest_epoch(self):
+        return int(self.rows['epoch'][-1]) if self.rows is not None and len(self.rows) else 0
+
+    def since(self, last_epoch, limit):
+        if self.rows is None:
+            return []
+        start = int(np.searchsorted(self.rows['epoch'], last_epoch, side='right'))
+        return self._records(self.rows[start:start + limit])
+
+
+alert_source = AlertCache(API_PREDICTIONS_CSV) if API_PREDICTIONS_CSV else StoreAlertCache(API_RECORD)
+alert_cache = SharedAlertIndex(API_SHARED_DIR, alert_source) if API_SHARED_DIR else alert_source
+
+
 @app.get("/alerts")
-def get_apnea_alerts(limit: Optional[int] = 50):
-    # Load features CSV
-    df = pd.read_csv('data/combined/features_advanced_predictions.csv')
-    
-    # Filter to show only Apnea (2) and Warnings (1)
-    alert_df = df[df['predicted_label'].isin([1, 2])]
-    
+def get_apnea_alerts(response: Response, limit: Optional[int] = 50, if_none_match: Optional[str] = Header(None)):
+    try:
+        alert_cache.refresh()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Predictions file not found: {alert_cache.path}")
+
+    etag = f'"{alert_cache.version}-{limit}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
     # Get most recent alerts
-    recent_alerts = alert_df.tail(limit).to_dict(orient="records")
-    return recent_alerts
\ No newline at end of file
+    response.headers["ETag"] = etag
+    return alert_cache.recent(limit)
+
+
+
+ALERT_STREAM_POLL_S = 1.0
+ALERT_STREAM_KEEPALIVE_S = 15.0
+ALERT_STREAM_MAX_BATCH = 100  # alerts sent to one client before waiting for it to drain
+
+
+class AlertBroadcaster:
+    """
+    Watches the alert cache once for all stream clients and wakes them when new alerts arrive.
+    Clients keep their own cursor and read from the shared cache, so nothing is queued per client.
+    """
+    def __init__(self, cache, poll_s=ALERT_STREAM_POLL_S):
+        self.cache = cache
+        self.poll_s = poll_s
+        self._changed = None
+        self._watcher = None
+
+    def _ensure_watcher(self):
+        loop = asyncio.get_running_loop()
+        if self._watcher is None or self._watcher.done() or self._watcher.get_loop() is not loop:
+            self._changed = asyncio.Condition()
+            self._watcher = loop.create_task(self._watch())
+
+    async def _watch(self):
+        loop = asyncio.get_running_loop()
+        version = self.cache.version
+        while True:
+            try:
+                await loop.run_in_executor(None, self.cache.refresh)
+            except FileNotFoundError:
+                pass
+            if self.cache.version != version:
+                version = self.cache.version
+                async with self._changed:
+                    self._changed.notify_all()
+            await asyncio.sleep(self.poll_s)
+
+    async def wait(self, seen_version, timeout):
+        # Returns False on timeout; returns at once if the cache moved past seen_version already
+        self._ensure_watcher()
+        async with self._changed:
+            if self.cache.version != seen_version:
+                return True
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+
+alert_broadcaster = AlertBroadcaster(alert_cache)
+
+
+async def alert_events(request, last_epoch):
+    while not await request.is_disconnected():
+        version = alert_cache.version
+        batch = alert_cache.since(last_epoch, ALERT_STREAM_MAX_BATCH)
+        for alert in batch:
+            last_epoch = alert['epoch']
+            # Yielding waits for the transport, so a slow client only holds back its own stream
+            yield f"id: {last_epoch}\nevent: alert\ndata: {json.dumps(alert)}\n\n"
+        if len(batch) == ALERT_STREAM_MAX_BATCH:
+            continue
+        if not await alert_broadcaster.wait(version, ALERT_STREAM_KEEPALIVE_S):
+            yield ": keep-alive\n\n"
+
+
+@app.get("/alerts/stream")
+async def stream_apnea_alerts(request: Request, last_epoch: Optional[int] = None,
+                              last_event_id: Optional[str] = Header(None)):
+    """
+    Server-Sent Events stream of Pre-apnea Warning and Apnea alerts, each sent once with its
+    epoch as the event id. Resumes after last_epoch (or the Last-Event-ID a browser sends on
+    reconnect); without either, only alerts produced after connecting are sent.
+    """
+    if last_event_id is not None and last_event_id.isdigit():
+        last_epoch = int(last_event_id)
+    if last_epoch is None:
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, alert_cache.refresh)
+        except FileNotFoundError:
+            pass
+        last_epoch = alert_cache.latest_epoch()
+    return StreamingResponse(alert_events(request, last_epoch), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
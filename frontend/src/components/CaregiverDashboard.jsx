@@ -19,22 +19,38 @@ function CaregiverDashboard() {
   // Fetch alerts from API
   const fetchAlerts = async () => {
     setLoading(true);
+    let data = [];
     try {
       const response = await fetch("http://localhost:8000/alerts?limit=20");
-      const data = await response.json();
+      data = await response.json();
       setAlerts(data);
       setLastUpdate(new Date());
     } catch (error) {
       console.error("Failed to fetch alerts:", error);
     }
     setLoading(false);
+    return data;
   };
 
-  // Initial fetch and auto-refresh every 30 seconds
+  // Initial fetch, then the server pushes each new alert as it is produced
   useEffect(() => {
-    fetchAlerts();
-    const interval = setInterval(fetchAlerts, 30000);
-    return () => clearInterval(interval);
+    let source = null;
+    let closed = false;
+    fetchAlerts().then((data) => {
+      if (closed) return;
+      const lastEpoch = data.length > 0 ? data[data.length - 1].epoch : null;
+      const query = lastEpoch != null ? `?last_epoch=${lastEpoch}` : "";
+      source = new EventSource(`http://localhost:8000/alerts/stream${query}`);
+      source.addEventListener("alert", (event) => {
+        const alert = JSON.parse(event.data);
+        setAlerts((prev) => [...prev, alert].slice(-20));
+        setLastUpdate(new Date());
+      });
+    });
+    return () => {
+      closed = true;
+      if (source) source.close();
+    };
   }, []);
 
   // Calculate statistics
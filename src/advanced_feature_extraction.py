@@ -1,9 +1,26 @@
+import warnings
 import numpy as np
 import pandas as pd
-import os
 from scipy.stats import skew, kurtosis
 from scipy.signal import welch
-from antropy import app_entropy, sample_entropy
+from fast_entropy import batch_entropy
+from epoch_store import open_epochs
+from feature_store import FEATURE_STORE_DIR, write_partition
+from feature_cache import FeatureCache, cached_features
+from instrumentation import timed, count
+
+# Feature columns in the order the XGBoost model was trained on
+FEATURE_COLUMNS = [
+    'mean', 'std', 'min', 'max', 'median',
+    'skewness', 'kurtosis',
+    'power_vlf', 'power_lf', 'power_hf',
+    'app_entropy', 'sample_entropy'
+]
+
+FREQ_BANDS = {'vlf': (0.003, 0.04), 'lf': (0.04, 0.15), 'hf': (0.15, 0.4)}
+
+# Bump whenever a feature definition changes, so cached feature rows are recomputed
+FEATURE_EXTRACTOR_VERSION = 1
 
 def extract_hrv_features(rr_intervals):
     # RR interval statistics
@@ -17,55 +34,83 @@ def extract_hrv_features(rr_intervals):
 def extract_frequency_features(epoch_signal, fs=100):
     # Power spectral density features
     f, pxx = welch(epoch_signal, fs, nperseg=min(256, len(epoch_signal)))
-    bands = {'vlf': (0.003, 0.04), 'lf': (0.04, 0.15), 'hf': (0.15, 0.4)}
     freq_feats = {}
-    for band, (low, high) in bands.items():
+    for band, (low, high) in FREQ_BANDS.items():
         mask = (f >= low) & (f < high)
         freq_feats[f'power_{band}'] = np.sum(pxx[mask])
     return freq_feats
 
 def extract_nonlinear_features(epoch_signal):
-    nonlinear_feats = {}
-    try:
-        nonlinear_feats['app_entropy'] = app_entropy(epoch_signal, order=2)
-        nonlinear_feats['sample_entropy'] = sample_entropy(epoch_signal, order=2)
-    except:
-        nonlinear_feats['app_entropy'] = 0
-        nonlinear_feats['sample_entropy'] = 0
-    return nonlinear_feats
+    feats = extract_nonlinear_features_batch(np.asarray(epoch_signal)[np.newaxis, :])
+    return {name: values[0] for name, values in feats.items()}
+
+def extract_time_features_batch(epochs):
+    """
+    Time-domain statistics for a (n_epochs, n_samples) matrix, computed along the sample axis.
+    """
+    return {
+        'mean': np.mean(epochs, axis=1),
+        'std': np.std(epochs, axis=1),
+        'min': np.min(epochs, axis=1),
+        'max': np.max(epochs, axis=1),
+        'median': np.median(epochs, axis=1),
+        'skewness': skew(epochs, axis=1),
+        'kurtosis': kurtosis(epochs, axis=1)
+    }
+
+def extract_frequency_features_batch(epochs, fs=100):
+    # One Welch call for the whole batch, then band sums over the frequency axis
+    f, pxx = welch(epochs, fs, nperseg=min(256, epochs.shape[1]), axis=-1)
+    freq_feats = {}
+    for band, (low, high) in FREQ_BANDS.items():
+        mask = (f >= low) & (f < high)
+        freq_feats[f'power_{band}'] = pxx[:, mask].sum(axis=1)
+    return freq_feats
+
+def extract_nonlinear_features_batch(epochs):
+    app_en, samp_en, failed = batch_entropy(epochs, order=2)
+    if failed.any():
+        # Undefined entropy (flat epoch or no matching templates) is kept as NaN, not masked as 0
+        count('apnea_entropy_undefined_total', int(failed.sum()), stage='features')
+        warnings.warn(f"Entropy undefined for {failed.sum()} of {len(failed)} epochs, kept as NaN", RuntimeWarning)
+    return {'app_entropy': app_en, 'sample_entropy': samp_en}
+
+def extract_features_batch(epochs, fs=100):
+    """
+    Compute all 12 advanced features for a (n_epochs, n_samples) matrix of equal-length epochs.
+    Returns a DataFrame with one row per epoch and columns in FEATURE_COLUMNS order.
+    """
+    epochs = np.asarray(epochs, dtype=np.float64)
+    if epochs.ndim == 1:
+        epochs = epochs[np.newaxis, :]
+    with timed('features.time'):
+        time_feats = extract_time_features_batch(epochs)
+    with timed('features.welch'):
+        freq_feats = extract_frequency_features_batch(epochs, fs)
+    with timed('features.entropy'):
+        nonlinear_feats = extract_nonlinear_features_batch(epochs)
+    count('apnea_epochs_total', len(epochs), stage='features')
+    return pd.DataFrame({**time_feats, **freq_feats, **nonlinear_feats}, columns=FEATURE_COLUMNS)
 
-def extract_features_for_all_epochs(epochs_dir, labels_csv, output_csv='data/combined/features_advanced.csv'):
-    labels_df = pd.read_csv(labels_csv)
-    feature_list = []
-    for idx, row in labels_df.iterrows():
-        epoch_num = row['epoch']
-        label = row['label']
-        epoch_path = os.path.join(epochs_dir, f'epoch_{epoch_num}.npy')
-        if not os.path.exists(epoch_path):
-            continue
-        epoch_signal = np.load(epoch_path)
-        basic_feats = {
-            'mean': np.mean(epoch_signal),
-            'std': np.std(epoch_signal),
-            'min': np.min(epoch_signal),
-            'max': np.max(epoch_signal),
-            'median': np.median(epoch_signal),
-            'skewness': skew(epoch_signal),
-            'kurtosis': kurtosis(epoch_signal)
-        }
-        freq_feats = extract_frequency_features(epoch_signal)
-        nonlinear_feats = extract_nonlinear_features(epoch_signal)
-        # If RR intervals available, add HRV features here with extract_hrv_features(rr_intervals)
-        all_feats = {**basic_feats, **freq_feats, **nonlinear_feats}
-        all_feats['label'] = label
-        all_feats['epoch'] = epoch_num
-        feature_list.append(all_feats)
+def extract_features_for_all_epochs(epochs_dir, record='x01', store_dir=FEATURE_STORE_DIR, cache=None, fs=100):
+    """
+    Features for every epoch of a record, stored as its features partition (labels are joined
+    when the table is read). With a FeatureCache, only epochs whose content is new are computed.
+    """
+    epochs = open_epochs(epochs_dir, record)
+    if len(epochs):
+        features_df = cached_features(epochs, lambda batch: extract_features_batch(batch, fs), FEATURE_COLUMNS,
+                                      cache, 'advanced', FEATURE_EXTRACTOR_VERSION, fs)
+    else:
+        features_df = pd.DataFrame(columns=FEATURE_COLUMNS, dtype=np.float32)
+    # If RR intervals available, add HRV features here with extract_hrv_features(rr_intervals)
+    features_df['epoch'] = np.arange(1, len(epochs) + 1)
 
-    features_df = pd.DataFrame(feature_list)
-    features_df.to_csv(output_csv, index=False)
-    print(f"Advanced features with labels saved to {output_csv}")
+    path = write_partition(features_df, 'features', record, store_dir)
+    print(f"Advanced features saved to {path}")
+    if cache is not None:
+        print(f"Feature cache: {cache.stats()}")
 
 if __name__ == "__main__":
     epochs_directory = 'data/processed_15s_epochs'
-    label_file = 'data/epoch_labels.csv'
-    extract_features_for_all_epochs(epochs_directory, label_file)
\ No newline at end of file
+    extract_features_for_all_epochs(epochs_directory, cache=FeatureCache())
\ No newline at end of file
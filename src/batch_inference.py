@@ -1,20 +1,18 @@
 # src/batch_inference.py
-import os
-import numpy as np
-from inference import load_model, preprocess_signal, predict_apnea
+from inference import load_model, preprocess_record_epochs, predict_apnea
+from epoch_store import open_epochs
 import csv
 
-def batch_inference(epochs_folder='new_patient_epochs'):
+def batch_inference(epochs_folder='new_patient_epochs', record='x01'):
     model = load_model()
     results = []
-    for fname in sorted(os.listdir(epochs_folder)):
-        if fname.endswith('.npy'):
-            epoch_path = os.path.join(epochs_folder, fname)
-            signal_epoch = np.load(epoch_path)
-            preprocessed = preprocess_signal(signal_epoch)
-            label, prob = predict_apnea(model, preprocessed)
-            results.append((fname, label, prob))
-            print(f"{fname}: Label={label}, Probability={prob:.2f}")
+    # Filter the record as one signal so epoch edges match whole-record filtering
+    epochs = preprocess_record_epochs(open_epochs(epochs_folder, record))
+    for i, preprocessed in enumerate(epochs):
+        name = f'epoch_{i+1}'
+        label, prob = predict_apnea(model, preprocessed)
+        results.append((name, label, prob))
+    print(f"Scored {len(results)} epochs of record {record}")
     return results
 
 if __name__ == "__main__":
@@ -0,0 +1,182 @@
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from functools import partial
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+from epoch_store import epochs_path, list_records, load_index, open_epochs
+from advanced_feature_extraction import FEATURE_COLUMNS, FEATURE_EXTRACTOR_VERSION, extract_features_batch
+import feature_extraction_multiclass as multiclass_features
+from feature_cache import FEATURE_CACHE_PATH, FeatureCache, cached_features
+from feature_store import FEATURE_STORE_DIR, write_partition
+from event_consolidation import consolidate_events
+from model_registry import REGISTRY_DIR, ModelRegistry, current_version, legacy_version
+from predictor import LABEL_MAP
+from instrumentation import write_report, run_and_collect, merge_results
+
+MODEL_NAME = 'xgboost_balanced'
+FALLBACK_MODEL = 'models/xgboost_balanced_model.pkl'
+ALERT_LABELS = [1, 2]  # Warnings (1) and Apnea (2)
+RUNS_DIR = 'batch_runs'  # completion markers, inside the feature store
+
+# Set in each worker by _init_worker: the model is loaded once per process, not per record
+_predictor = None
+_model_version = None
+_cache = None
+_lstm = None
+
+
+def _init_worker(model_name, fallback_path, cache_path, lstm_path=None):
+    global _predictor, _model_version, _cache, _lstm
+    registry = ModelRegistry(model_name, fallback_path=fallback_path)
+    _predictor = registry.load()
+    _model_version = registry.version
+    _cache = FeatureCache(cache_path) if cache_path else None
+    if lstm_path:
+        from lstm_inference import LSTMEngine  # torch is only needed when LSTM scoring is asked for
+        # One torch thread per worker: the pool already uses every core
+        _lstm = LSTMEngine.load(lstm_path, threads=1)
+
+
+def _marker_path(store_dir, record):
+    return os.path.join(store_dir, RUNS_DIR, f'{record}.json')
+
+
+def lstm_version(lstm_path):
+    if not lstm_path:
+        return None
+    st = os.stat(lstm_path)
+    return f'{os.path.basename(lstm_path)}:{st.st_size:x}-{st.st_mtime_ns:x}'
+
+
+def _source_stamp(epochs_dir, record, model_version, lstm_model=None):
+    # What a record's results were computed from; any change makes the record run again
+    st = os.stat(epochs_path(epochs_dir, record))
+    return {'epochs_mtime_ns': st.st_mtime_ns, 'epochs_size': st.st_size,
+            'model_version': model_version, 'extractor_version': FEATURE_EXTRACTOR_VERSION,
+            'lstm_model': lstm_model}
+
+
+def is_done(epochs_dir, store_dir, record, model_version, lstm_model=None):
+    try:
+        with open(_marker_path(store_dir, record)) as f:
+            marker = json.load(f)
+    except FileNotFoundError:
+        return False
+    stamp = _source_stamp(epochs_dir, record, model_version, lstm_model)
+    return all(marker.get(k) == v for k, v in stamp.items())
+
+
+def score_record(record, epochs_dir, store_dir, max_gap=1, lstm_model=None):
+    """
+    Features, predictions and consolidated events for one record, written to its predictions and
+    events partitions (and lstm_predictions/lstm_events when the worker has an LSTM). A completion
+    marker is written last, so an interrupted record reruns.
+    """
+    start = time.perf_counter()
+    epochs = open_epochs(epochs_dir, record)
+    fs = int(load_index(epochs_dir, record)['fs'].iloc[0]) if len(epochs) else 100
+
+    df = cached_features(epochs, lambda batch: extract_features_batch(batch, fs), FEATURE_COLUMNS,
+                         _cache, 'advanced', FEATURE_EXTRACTOR_VERSION, fs)
+    if len(df):
+        labels, proba = _predictor.predict(df)
+    else:
+        labels, proba = np.zeros(0, dtype=int), np.zeros((0, len(LABEL_MAP)))
+    df['epoch'] = np.arange(1, len(epochs) + 1)
+    df['predicted_label'] = labels
+    df['predicted_label_str'] = df['predicted_label'].map(LABEL_MAP)
+    df['predicted_prob'] = proba.max(axis=1)
+    write_partition(df, 'predictions', record, store_dir)
+
+    events = consolidate_events(df.loc[df['predicted_label'].isin(ALERT_LABELS), 'epoch'], max_gap)
+    write_partition(events, 'events', record, store_dir)
+    if _lstm is not None:
+        score_record_lstm(epochs, record, store_dir, fs, max_gap)
+
+    seconds = time.perf_counter() - start
+    result = {'record': record, 'epochs': len(epochs), 'events': len(events), 'seconds': round(seconds, 3),
+              **_source_stamp(epochs_dir, record, _model_version, lstm_model)}
+    marker = _marker_path(store_dir, record)
+    os.makedirs(os.path.dirname(marker), exist_ok=True)
+    with open(marker + '.tmp', 'w') as f:
+        json.dump(result, f)
+    os.replace(marker + '.tmp', marker)
+    return result
+
+
+def score_record_lstm(epochs, record, store_dir, fs, max_gap=1):
+    # Sequence predictions from the multiclass features, one per epoch that ends a full window
+    df = cached_features(epochs, multiclass_features.extract_features_for_epochs, _lstm.feature_names, _cache,
+                         'multiclass', multiclass_features.FEATURE_EXTRACTOR_VERSION, fs)
+    df['epoch'] = np.arange(1, len(epochs) + 1)
+    predictions = _lstm.score_frame(df)
+    write_partition(predictions, 'lstm_predictions', record, store_dir)
+    events = consolidate_events(predictions.loc[predictions['predicted_label'].isin(ALERT_LABELS), 'epoch'], max_gap)
+    write_partition(events, 'lstm_events', record, store_dir)
+
+
+def run_batch(records=None, epochs_dir='data/processed_15s_epochs', store_dir=FEATURE_STORE_DIR, workers=None,
+              resume=True, model_name=MODEL_NAME, fallback_path=FALLBACK_MODEL, cache_path=FEATURE_CACHE_PATH,
+              lstm_path=None):
+    """
+    Score many patient records across a process pool, one record per task.
+
+    Params:
+      - records: records of the epoch store to score (default: all of them)
+      - workers: number of worker processes (default: all cores); 1 runs serially in this process
+      - resume: skip records already scored from the same epochs with the same model version
+      - cache_path: feature cache shared by the workers (None disables it)
+      - lstm_path: also score every record with this LSTM (.pth state dict or exported .pt)
+    Returns:
+      - DataFrame with one row per scored record (epochs, events, seconds)
+    """
+    records = list_records(epochs_dir) if records is None else list(records)
+    model_version = current_version(model_name, REGISTRY_DIR) or legacy_version(fallback_path)
+    lstm_model = lstm_version(lstm_path)
+    todo = [r for r in records if not (resume and is_done(epochs_dir, store_dir, r, model_version, lstm_model))]
+    if len(todo) < len(records):
+        print(f"Resuming: {len(records) - len(todo)} of {len(records)} records already scored with {model_version}")
+    if not todo:
+        return pd.DataFrame(columns=['record', 'epochs', 'events', 'seconds'])
+
+    workers = min(workers or mp.cpu_count(), len(todo))
+    print(f"Scoring {len(todo)} records with {workers} worker(s)...")
+    task = partial(run_and_collect, score_record, epochs_dir=epochs_dir, store_dir=store_dir, lstm_model=lstm_model)
+    init_args = (model_name, fallback_path, cache_path, lstm_path)
+    start = time.perf_counter()
+    if workers == 1:
+        _init_worker(*init_args)
+        results = merge_results(task(record) for record in tqdm(todo))
+    else:
+        with mp.Pool(workers, initializer=_init_worker, initargs=init_args) as pool:
+            results = merge_results(tqdm(pool.imap_unordered(task, todo), total=len(todo)))
+    elapsed = time.perf_counter() - start
+
+    summary = pd.DataFrame(results, columns=['record', 'epochs', 'events', 'seconds']).sort_values('record')
+    total = int(summary['epochs'].sum())
+    print(f"{total} epochs from {len(summary)} records in {elapsed:.1f}s ({total / elapsed:.1f} epochs/s)")
+    write_report(os.path.join(store_dir, RUNS_DIR, 'run_report.json'), records=len(summary), workers=workers,
+                 epochs=total, seconds=round(elapsed, 3))
+    return summary.reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    # Usage: python src/batch_runner.py [--workers N] [--lstm model.pth] [--force] [record ...]
+    args = sys.argv[1:]
+    workers = None
+    if '--workers' in args:
+        i = args.index('--workers')
+        workers = int(args[i + 1])
+        del args[i:i + 2]
+    lstm_path = None
+    if '--lstm' in args:
+        i = args.index('--lstm')
+        lstm_path = args[i + 1]
+        del args[i:i + 2]
+    force = '--force' in args
+    records = [a for a in args if a != '--force'] or None
+    print(run_batch(records, workers=workers, resume=not force, lstm_path=lstm_path).to_string(index=False))
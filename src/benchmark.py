@@ -0,0 +1,286 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from resampling import resample_signal
+from signal_filters import bandpass_filter_chunked
+from epoch_store import write_epoch_store, open_epochs
+from epoch_labeling import label_apnea_intervals
+from advanced_feature_extraction import (FEATURE_COLUMNS, extract_time_features_batch,
+                                         extract_frequency_features_batch, extract_nonlinear_features_batch,
+                                         extract_features_batch)
+from event_consolidation import consolidate_events
+from predictor import Predictor, LABEL_MAP
+
+EPOCH_DURATION = 15
+
+
+def synthetic_ecg(minutes=60, fs=100, apnea_density=0.3, seed=0):
+    """
+    ECG-like test signal with apnea episodes, so benchmarks need no PhysioNet download.
+
+    Beats are a QRS spike plus a T wave at 60-75 bpm with beat-to-beat jitter, amplitude-modulated
+    by breathing at 0.25 Hz. During apnea episodes (20-60 s, covering about apnea_density of the
+    recording) breathing stops and the heart rate slows. Returns (signal, events DataFrame with
+    start_sec and end_sec).
+    """
+    rng = np.random.default_rng(seed)
+    duration = minutes * 60
+    n = int(duration * fs)
+
+    # Apnea episodes at random non-overlapping positions until the target density is covered
+    starts, ends, covered = [], [], 0.0
+    cursor = rng.uniform(30, 120)
+    while covered < apnea_density * duration and cursor < duration - 60:
+        length = rng.uniform(20, 60)
+        starts.append(cursor)
+        ends.append(cursor + length)
+        covered += length
+        gap = length * (1 - apnea_density) / max(apnea_density, 1e-6)
+        cursor += length + rng.uniform(0.5, 1.5) * gap
+    events = pd.DataFrame({'start_sec': starts, 'end_sec': ends}, columns=['start_sec', 'end_sec'])
+
+    t = np.arange(n) / fs
+    in_apnea = np.zeros(n, dtype=bool)
+    for s, e in zip(starts, ends):
+        in_apnea[int(s * fs):int(e * fs)] = True
+
+    # Beat times from a heart rate that drops by ~15% during apnea
+    beats = []
+    time_s = 0.0
+    while time_s < duration:
+        hr = rng.uniform(60, 75) * (0.85 if in_apnea[min(int(time_s * fs), n - 1)] else 1.0)
+        time_s += 60 / hr + rng.normal(0, 0.02)
+        beats.append(time_s)
+    beat_idx = (np.asarray(beats[:-1]) * fs).astype(int)
+    beat_idx = beat_idx[beat_idx < n]
+
+    impulses = np.zeros(n)
+    respiration = np.where(in_apnea, 0.0, 0.2 * np.sin(2 * np.pi * 0.25 * t))
+    impulses[beat_idx] = 1.0 + respiration[beat_idx]
+    k = np.arange(-int(0.1 * fs), int(0.4 * fs)) / fs
+    beat_shape = np.exp(-0.5 * (k / 0.01) ** 2) + 0.3 * np.exp(-0.5 * ((k - 0.25) / 0.04) ** 2)
+    signal = np.convolve(impulses, beat_shape, mode='same')
+    signal += 0.1 * np.sin(2 * np.pi * 0.1 * t) + 0.05 * rng.standard_normal(n)
+    return signal, events
+
+
+def time_it(fn, repeat=3):
+    """Run fn repeat times; returns (last result, list of wall-clock seconds)."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, times
+
+
+def _row(name, times, items=None, unit=None):
+    row = {'name': name, 'repeat': len(times), 'seconds_min': min(times), 'seconds_median': float(np.median(times))}
+    if items is not None:
+        row['items'] = items
+        row['unit'] = unit
+        row['throughput_per_s'] = items / min(times) if min(times) > 0 else None
+    return row
+
+
+def benchmark_pipeline(minutes=60, raw_fs=128, fs=100, apnea_density=0.3, repeat=3, seed=0, work_dir=None):
+    """Time every batch stage on one synthetic record. Returns (result rows, trained predictor, predictions)."""
+    raw, events = synthetic_ecg(minutes, raw_fs, apnea_density, seed)
+    results = []
+
+    resampled, times = time_it(lambda: resample_signal(raw[:, np.newaxis], raw_fs, fs, block_size=600 * raw_fs), repeat)
+    results.append(_row('preprocess.resample', times, len(raw), 'samples'))
+    filtered, times = time_it(lambda: bandpass_filter_chunked(resampled, fs), repeat)
+    results.append(_row('preprocess.bandpass', times, len(resampled), 'samples'))
+    signal = ((filtered - filtered.mean()) / filtered.std())[:, 0]
+
+    store_dir = os.path.join(work_dir, 'epochs')
+    num_epochs, times = time_it(lambda: write_epoch_store(signal, 'bench', fs, EPOCH_DURATION, store_dir), repeat)
+    results.append(_row('segmentation', times, num_epochs, 'epochs'))
+    epochs = np.asarray(open_epochs(store_dir, 'bench'), dtype=np.float64)
+
+    labels, times = time_it(lambda: label_apnea_intervals(events['start_sec'], events['end_sec'],
+                                                          num_epochs, EPOCH_DURATION), repeat)
+    results.append(_row('labels', times, num_epochs, 'epochs'))
+
+    _, times = time_it(lambda: extract_time_features_batch(epochs), repeat)
+    results.append(_row('features.time', times, num_epochs, 'epochs'))
+    _, times = time_it(lambda: extract_frequency_features_batch(epochs, fs), repeat)
+    results.append(_row('features.welch', times, num_epochs, 'epochs'))
+    _, times = time_it(lambda: extract_nonlinear_features_batch(epochs), repeat)
+    results.append(_row('features.entropy', times, num_epochs, 'epochs'))
+    features, times = time_it(lambda: extract_features_batch(epochs, fs), 1)
+    results.append(_row('features.all', times, num_epochs, 'epochs'))
+
+    # A small model trained on the synthetic features stands in for the production one
+    from xgboost import XGBClassifier
+    clf = XGBClassifier(n_estimators=100, max_depth=6, tree_method='hist', random_state=seed)
+    y = np.asarray(labels)
+    y[:3] = [0, 1, 2]  # every class present, whatever the apnea density
+    clf.fit(features[FEATURE_COLUMNS], y)
+    predictor = Predictor(clf, FEATURE_COLUMNS)
+    X = features[FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+    (pred, proba), times = time_it(lambda: predictor.predict(X), repeat)
+    results.append(_row('model.score_batch', times, num_epochs, 'epochs'))
+    _, times = time_it(lambda: [predictor.predict(X[i:i + 1]) for i in range(min(200, len(X)))], repeat)
+    results.append(_row('model.score_single', times, min(200, len(X)), 'epochs'))
+
+    alert_epochs = np.flatnonzero(np.isin(pred, [1, 2])) + 1
+    _, times = time_it(lambda: consolidate_events(alert_epochs, 1), repeat)
+    results.append(_row('consolidation', times, len(alert_epochs), 'alert epochs'))
+
+    predictions = features.copy()
+    predictions['epoch'] = np.arange(1, num_epochs + 1)
+    predictions['predicted_label'] = pred
+    predictions['predicted_label_str'] = predictions['predicted_label'].map(LABEL_MAP)
+    predictions['predicted_prob'] = proba.max(axis=1)
+    return results, clf, predictions
+
+
+def _latency_row(name, latencies, elapsed, errors):
+    lat = np.asarray(latencies) * 1000
+    return {
+        'name': name, 'requests': len(lat), 'errors': errors, 'seconds': elapsed,
+        'requests_per_s': len(lat) / elapsed if elapsed > 0 else None,
+        'latency_ms_p50': float(np.percentile(lat, 50)), 'latency_ms_p95': float(np.percentile(lat, 95)),
+        'latency_ms_p99': float(np.percentile(lat, 99)), 'latency_ms_max': float(lat.max())
+    }
+
+
+async def _load(client, method, url, payloads, concurrency):
+    # `concurrency` clients issue requests back to back until all payloads are sent
+    latencies, errors = [], 0
+    queue = list(payloads)
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            payload = queue.pop()
+            start = time.perf_counter()
+            r = await client.request(method, url, json=payload)
+            latencies.append(time.perf_counter() - start)
+            errors += r.status_code >= 400
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, time.perf_counter() - start, errors
+
+
+def benchmark_api(model, predictions, work_dir, requests=1000, concurrency=32):
+    """
+    /predict and /alerts latency under concurrent load, served in-process (ASGI, no network)
+    from a registry and feature store in work_dir populated with the benchmark's model and data.
+    """
+    import httpx
+    from model_registry import publish_model
+    from feature_store import write_partition
+
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        publish_model(model, 'xgboost_balanced', FEATURE_COLUMNS)
+        write_partition(predictions, 'predictions', 'bench')
+        os.environ['API_RECORD'] = 'bench'
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from api import main
+
+        features = predictions[FEATURE_COLUMNS].astype(float).to_dict(orient='records')
+        payloads = [{'features': features[i % len(features)]} for i in range(requests)]
+
+        async def run():
+            main.load_model_on_startup()
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+                await client.get('/alerts')  # warm the alert cache
+                rows = []
+                for name, method, url, body in [('api.predict', 'POST', '/predict', payloads),
+                                                ('api.alerts', 'GET', '/alerts?limit=50', [None] * requests)]:
+                    latencies, elapsed, errors = await _load(client, method, url, body, concurrency)
+                    rows.append({**_latency_row(name, latencies, elapsed, errors), 'concurrency': concurrency})
+                return rows
+
+        return asyncio.run(run())
+    finally:
+        os.chdir(cwd)
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    import scipy
+    import xgboost
+    return {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+            'cpu_count': os.cpu_count(), 'numpy': np.__version__, 'scipy': scipy.__version__,
+            'pandas': pd.__version__, 'xgboost': xgboost.__version__}
+
+
+def compare(baseline_path, results):
+    """Print the change of each benchmark against a previous results file (lower time is better)."""
+    with open(baseline_path) as f:
+        baseline = {r['name']: r for r in json.load(f)['results']}
+    print(f"\nCompared with {baseline_path}:")
+    for row in results:
+        old = baseline.get(row['name'])
+        key = 'seconds_min' if 'seconds_min' in row else 'latency_ms_p95'
+        if old is None or not old.get(key):
+            continue
+        print(f"  {row['name']:<22} {old[key]:>10.4f} -> {row[key]:>10.4f}  ({row[key] / old[key]:.2f}x)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic ECG.")
+    parser.add_argument('--minutes', type=float, default=60, help="length of the synthetic recording")
+    parser.add_argument('--apnea-density', type=float, default=0.3, help="fraction of the recording in apnea")
+    parser.add_argument('--raw-fs', type=int, default=128, help="sampling rate before resampling to 100 Hz")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=1000, help="requests per API endpoint")
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--skip-api', action='store_true')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help="previous results file to compare against")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results, model, predictions = benchmark_pipeline(args.minutes, args.raw_fs, 100, args.apnea_density,
+                                                         args.repeat, args.seed, work_dir)
+        if not args.skip_api:
+            results += benchmark_api(model, predictions, work_dir, args.requests, args.concurrency)
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'config': vars(args),
+        'environment': environment(),
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for row in results:
+        if 'seconds_min' in row:
+            rate = f"{row['throughput_per_s']:>12.0f} {row['unit']}/s" if row.get('throughput_per_s') else ''
+            print(f"{row['name']:<22} {row['seconds_min'] * 1000:>10.2f} ms  {rate}")
+        else:
+            print(f"{row['name']:<22} p50 {row['latency_ms_p50']:.2f} ms, p95 {row['latency_ms_p95']:.2f} ms, "
+                  f"{row['requests_per_s']:.0f} req/s at concurrency {row['concurrency']}")
+    print(f"Results saved to {args.output}")
+    if args.compare:
+        compare(args.compare, results)
+    return report
+
+
+if __name__ == "__main__":
+    main()
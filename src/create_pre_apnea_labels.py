@@ -1,55 +1,41 @@
 import numpy as np
 import pandas as pd
+from epoch_store import load_index
+from epoch_labeling import label_apnea_intervals
+from feature_store import write_partition
 
-def create_15s_epoch_labels(epochs_dir, annotation_df, fs=100, epoch_duration=15):
+def create_15s_epoch_labels(epochs_dir, annotation_df, fs=100, epoch_duration=15, record='x01'):
     """
     Assign labels to 15-sec epochs with pre-apnea warning (1) and apnea (2).
     
     Args:
-    - epochs_dir: directory with segmented 15-s epochs (named epoch_1.npy, epoch_2.npy,...)
+    - epochs_dir: epoch store directory with the segmented 15-s epochs
     - annotation_df: DataFrame with columns 'start_sec', 'end_sec' for apnea events (in seconds)
     - fs: sampling frequency (Hz)
     - epoch_duration: duration of each epoch in seconds
+    - record: record name within the epoch store
     
     Returns:
     - labels: list of integer labels for each epoch
     """
     
-    import os
-    num_epochs = len([f for f in os.listdir(epochs_dir) if f.endswith('.npy')])
-    labels = np.zeros(num_epochs, dtype=int)
-    
-    # Convert apnea event times to epoch indices
-    for _, row in annotation_df.iterrows():
-        apnea_start = row['start_sec']
-        apnea_end = row['end_sec']
-        
-        # Apnea epoch indices (1-based)
-        start_epoch = int(apnea_start // epoch_duration) + 1
-        end_epoch = int(apnea_end // epoch_duration) + 1
-        
-        # Pre-apnea epochs: 1 epoch before start_epoch
-        pre_apnea_epoch = max(start_epoch - 1, 1)
-        
-        # Assign apnea label (2)
-        for e in range(start_epoch, end_epoch + 1):
-            if e <= num_epochs:
-                labels[e-1] = 2
-        
-        # Assign pre-apnea label (1) if not already apnea
-        if pre_apnea_epoch <= num_epochs and labels[pre_apnea_epoch - 1] == 0:
-            labels[pre_apnea_epoch - 1] = 1
-    
-    return labels
+    num_epochs = len(load_index(epochs_dir, record))
+    if len(annotation_df) == 0:
+        return np.zeros(num_epochs, dtype=int)
 
-if __name__ == "__main__":
-    # Load your apnea annotations from CSV or other source
+    # Apnea epochs get 2, the epoch before each event start gets 1 unless it is apnea itself
+    return label_apnea_intervals(annotation_df['start_sec'], annotation_df['end_sec'], num_epochs, epoch_duration)
+
+def save_record_labels(record='x01', epochs_dir='data/processed_15s_epochs', annotations_csv=None):
     # Expected columns: 'start_sec', 'end_sec' with apnea event times in seconds
-    annotations = pd.read_csv('data/apnea_annotations_x01.csv')
-    epochs_dir = 'data/processed_15s_epochs'
-    
-    labels = create_15s_epoch_labels(epochs_dir, annotations)
-    
-    # Save labels to CSV for reference
-    pd.DataFrame({'epoch': list(range(1, len(labels)+1)), 'label': labels}).to_csv('data/epoch_labels.csv', index=False)
-    print("Pre-apnea labels created and saved to data/epoch_labels.csv")
\ No newline at end of file
+    annotations = pd.read_csv(annotations_csv or f'data/apnea_annotations_{record}.csv')
+    labels = create_15s_epoch_labels(epochs_dir, annotations, record=record)
+
+    # Save labels to the feature store (labels table, one partition per record)
+    labels_df = pd.DataFrame({'epoch': np.arange(1, len(labels) + 1), 'label': np.asarray(labels, dtype=np.int8)})
+    path = write_partition(labels_df, 'labels', record)
+    print(f"Pre-apnea labels created and saved to {path}")
+    return path
+
+if __name__ == "__main__":
+    save_record_labels('x01')
\ No newline at end of file
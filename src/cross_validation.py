@@ -0,0 +1,227 @@
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from functools import partial
+import numpy as np
+import pandas as pd
+from imblearn.over_sampling import SMOTE
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import balanced_accuracy_score, classification_report
+from sklearn.model_selection import GroupKFold, train_test_split
+from xgboost import XGBClassifier
+from feature_store import read_labeled
+from predictor import LABEL_MAP
+from instrumentation import timed, write_report, run_and_collect, merge_results
+
+CV_DIR = 'models/cv'  # per-fold reports
+N_SPLITS = 5
+
+# Set in each worker by _init_worker: the data is sent once per process, not once per fold
+_X = None
+_y = None
+
+
+def make_model(name, n_jobs=1, random_state=42, **params):
+    # Histogram-based XGBoost; RF has no histogram mode, but builds its trees on all of its cores.
+    # params (e.g. tuned by hyperparameter_search) override the defaults.
+    if name == 'xgboost':
+        return XGBClassifier(**{'tree_method': 'hist', 'eval_metric': 'mlogloss', **params},
+                             random_state=random_state, n_jobs=n_jobs)
+    if name == 'rf':
+        return RandomForestClassifier(**{'n_estimators': 100, **params}, random_state=random_state, n_jobs=n_jobs)
+    raise ValueError(f"Unknown model: {name}")
+
+
+def oversample(X, y, random_state=42):
+    """
+    SMOTE on training rows only; classes too small for SMOTE's neighbours are left as they are.
+    Rows with undefined features (NaN entropy or moments of a flat epoch) cannot be interpolated
+    and are dropped first.
+    """
+    defined = ~np.isnan(X).any(axis=1)
+    if not defined.all():
+        print(f"Dropping {np.count_nonzero(~defined)} of {len(X)} training rows with undefined features before SMOTE")
+        X, y = X[defined], y[defined]
+    if len(np.unique(y)) < 2:
+        return X, y
+    smallest = np.bincount(y)[np.unique(y)].min()
+    if smallest < 2:
+        return X, y
+    return SMOTE(random_state=random_state, k_neighbors=min(5, smallest - 1)).fit_resample(X, y)
+
+
+def fit_model(name, X, y, smote=True, n_jobs=1, **params):
+    X, y = np.ascontiguousarray(X, dtype=np.float32), np.asarray(y)
+    if smote:
+        X, y = oversample(X, y)
+    model = make_model(name, n_jobs, **params)
+    model.fit(X, y)
+    return model
+
+
+def _init_worker(X, y):
+    global _X, _y
+    _X, _y = X, y
+
+
+def run_fold(fold, model_name, smote, n_jobs):
+    """Train on one fold's training records and score its held-out records. Returns metrics and timings."""
+    number, train_idx, test_idx = fold
+    start = time.perf_counter()
+    X_train, y_train = _X[train_idx], _y[train_idx]
+    with timed('cv.smote'):
+        if smote:
+            X_train, y_train = oversample(X_train, y_train)
+    smote_s = time.perf_counter() - start
+
+    with timed('cv.fit'):
+        model = make_model(model_name, n_jobs)
+        model.fit(X_train, y_train)
+    fit_s = time.perf_counter() - start - smote_s
+
+    y_pred = model.predict(_X[test_idx])
+    y_true = _y[test_idx]
+    report = classification_report(y_true, y_pred, labels=list(LABEL_MAP), target_names=list(LABEL_MAP.values()),
+                                   output_dict=True, zero_division=0)
+    row = {
+        'fold': number,
+        'train_rows': len(train_idx),
+        'train_rows_resampled': len(y_train),
+        'test_rows': len(test_idx),
+        'accuracy': report['accuracy'],
+        'balanced_accuracy': balanced_accuracy_score(y_true, y_pred),
+        'macro_f1': report['macro avg']['f1-score'],
+    }
+    for label, name in LABEL_MAP.items():
+        row[f'recall_{label}'] = report[name]['recall']
+        row[f'f1_{label}'] = report[name]['f1-score']
+    row.update({'smote_s': round(smote_s, 3), 'fit_s': round(fit_s, 3),
+                'total_s': round(time.perf_counter() - start, 3)})
+    return row
+
+
+def grouped_folds(groups, n_splits=N_SPLITS):
+    """K folds that never put epochs of one record in both training and test rows."""
+    groups = np.asarray(groups)
+    n_splits = min(n_splits, len(np.unique(groups)))
+    if n_splits < 2:
+        raise ValueError("Grouped cross-validation needs at least two records")
+    return [(i, train, test) for i, (train, test) in enumerate(GroupKFold(n_splits).split(groups, groups=groups))]
+
+
+def holdout_split(groups, test_size=0.2, random_state=42):
+    """
+    Train/validation row indices with whole records on either side. With a single record the
+    split falls back to random rows, which overlapping windows make optimistic.
+    """
+    groups = np.asarray(groups)
+    records = np.unique(groups)
+    if len(records) < 2:
+        print("Only one record: falling back to a random row split")
+        return train_test_split(np.arange(len(groups)), test_size=test_size, random_state=random_state)
+    _, val_records = train_test_split(records, test_size=test_size, random_state=random_state)
+    val = np.isin(groups, val_records)
+    return np.flatnonzero(~val), np.flatnonzero(val)
+
+
+def cross_validate(X, y, groups, model_name='xgboost', n_splits=N_SPLITS, smote=True, workers=None,
+                   report_path=None):
+    """
+    Grouped K-fold cross-validation by record, with SMOTE fitted inside each training fold.
+
+    Params:
+      - X, y: feature matrix and integer labels; groups: the record of every row
+      - model_name: 'xgboost' or 'rf' (see make_model)
+      - workers: folds trained in parallel (default: one per fold, up to the core count); the
+        cores are split between them, so each model trains with cpu_count // workers threads
+      - report_path: JSON report of per-fold metrics and timings (default: models/cv/<model>.json)
+    Returns:
+      - DataFrame with one row per fold
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    y = np.asarray(y, dtype=np.int64)
+    folds = grouped_folds(groups, n_splits)
+    workers = min(workers or mp.cpu_count(), len(folds))
+    n_jobs = max(mp.cpu_count() // workers, 1)
+    print(f"{len(folds)}-fold grouped CV of {model_name} on {len(np.unique(groups))} records, "
+          f"{workers} worker(s) x {n_jobs} thread(s)...")
+
+    task = partial(run_and_collect, run_fold, model_name=model_name, smote=smote, n_jobs=n_jobs)
+    start = time.perf_counter()
+    if workers == 1:
+        _init_worker(X, y)
+        rows = merge_results(task(fold) for fold in folds)
+    else:
+        with mp.Pool(workers, initializer=_init_worker, initargs=(X, y)) as pool:
+            rows = merge_results(pool.imap_unordered(task, folds))
+    elapsed = time.perf_counter() - start
+
+    results = pd.DataFrame(rows).sort_values('fold').reset_index(drop=True)
+    metrics = ['accuracy', 'balanced_accuracy', 'macro_f1'] + [f'recall_{label}' for label in LABEL_MAP]
+    print(results[['fold', 'test_rows'] + metrics + ['fit_s', 'total_s']].to_string(index=False, float_format='%.4f'))
+    summary = {m: {'mean': float(results[m].mean()), 'std': float(results[m].std(ddof=0))} for m in metrics}
+    print("Mean " + ', '.join(f"{m}={s['mean']:.4f}±{s['std']:.4f}" for m, s in summary.items()))
+    print(f"Cross-validation finished in {elapsed:.1f}s")
+
+    report_path = report_path or os.path.join(CV_DIR, f'{model_name}.json')
+    os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump({'model': model_name, 'smote': smote, 'folds': results.to_dict(orient='records'),
+                   'summary': summary, 'workers': workers, 'threads_per_fold': n_jobs,
+                   'seconds': round(elapsed, 3)}, f, indent=2)
+    print(f"Cross-validation report saved to {report_path}")
+    write_report(os.path.join(CV_DIR, 'run_report.json'), model=model_name, folds=len(folds), workers=workers)
+    return results
+
+
+def holdout_evaluate(X, y, model_name='xgboost', smote=True, test_size=0.2):
+    """
+    Fallback when there is a single record: a stratified split of its rows, SMOTE fitted on the
+    training rows only. Neighbouring epochs land on both sides, so the scores are optimistic.
+    """
+    print("WARNING: only one record, so no grouped cross-validation is possible. Reporting a "
+          "stratified row holdout of that record instead; these scores are optimistic.")
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    y = np.asarray(y, dtype=np.int64)
+    counts = np.bincount(y)
+    stratify = y if counts[counts > 0].min() >= 2 else None
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=42,
+                                                        stratify=stratify)
+    model = fit_model(model_name, X_train, y_train, smote=smote, n_jobs=-1)
+    y_pred = model.predict(X_test)
+    names = dict(labels=list(LABEL_MAP), target_names=list(LABEL_MAP.values()), zero_division=0)
+    print(classification_report(y_test, y_pred, digits=4, **names))
+    return classification_report(y_test, y_pred, output_dict=True, **names)
+
+
+def evaluate(X, y, groups, model_name='xgboost', n_splits=N_SPLITS, smote=True, workers=None, report_path=None):
+    """Grouped cross-validation, or the single-record holdout when there is only one record."""
+    if len(np.unique(groups)) > 1:
+        return cross_validate(X, y, groups, model_name, n_splits, smote, workers, report_path)
+    return holdout_evaluate(X, y, model_name, smote)
+
+
+def labeled_matrix(table, records=None):
+    """Features, labels and record of every labeled row of a feature store table."""
+    df = read_labeled(table, records=records)
+    X = df.drop(['label', 'epoch', 'record'], axis=1)
+    return X, df['label'].to_numpy(), df['record'].to_numpy()
+
+
+if __name__ == "__main__":
+    # Usage: python src/cross_validation.py [--model xgboost|rf] [--table features] [--folds K]
+    #                                       [--workers N] [--no-smote] [record ...]
+    args = sys.argv[1:]
+    options = {'--model': 'xgboost', '--table': 'features', '--folds': N_SPLITS, '--workers': None}
+    for name in options:
+        if name in args:
+            i = args.index(name)
+            options[name] = args[i + 1]
+            del args[i:i + 2]
+    smote = '--no-smote' not in args
+    records = [a for a in args if a != '--no-smote'] or None
+    X, y, groups = labeled_matrix(options['--table'], records)
+    cross_validate(X, y, groups, options['--model'], int(options['--folds']), smote,
+                   int(options['--workers']) if options['--workers'] else None)
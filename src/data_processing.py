@@ -1,7 +1,6 @@
 # src/data_processing.py
 import wfdb
 import numpy as np
-from scipy.signal import resample, butter, filtfilt
 import os
 import glob
 import shutil
@@ -9,11 +8,15 @@ from tqdm import tqdm
 import multiprocessing as mp
 from functools import partial
 from constants import FS, EPOCH_DURATION
+from epoch_labeling import label_apnea_epochs
+from signal_filters import bandpass_filter_chunked
+from resampling import resample_signal
+from instrumentation import timed, write_report, run_and_collect, merge_results
 
 
 def download_and_preprocess(record_name, target_fs=FS):
     record_path = os.path.join('data/raw', record_name)
-    if not os.path.exists(record_path):
+    if not os.path.exists(f'{record_path}.hea'):
         print(f"Downloading record {record_name}...")
         wfdb.dl_database('apnea-ecg', dl_dir='data/raw', records=[record_name])
     else:
@@ -25,9 +28,10 @@ def download_and_preprocess(record_name, target_fs=FS):
         signals = record.p_signal[:, 0:1]  # ECG first channel
         fs = record.fs
         if fs != target_fs:
-            signals = resample(signals, int(signals.shape[0] * target_fs / fs))
-        b, a = butter(4, [0.5, 40], btype='bandpass', fs=target_fs)
-        signals_filtered = filtfilt(b, a, signals, axis=0)
+            with timed('preprocess.resample'):
+                signals = resample_signal(signals, fs, target_fs, block_size=600 * fs)
+        with timed('preprocess.bandpass'):
+            signals_filtered = bandpass_filter_chunked(signals, target_fs)
         signals_normalized = (signals_filtered - np.mean(signals_filtered)) / np.std(signals_filtered)
         return signals_normalized, annotation, target_fs
     except Exception as e:
@@ -52,17 +56,7 @@ def get_labels(annotation, fs=FS, epoch_duration=EPOCH_DURATION, epochs=None):
     if annotation is None or epochs is None or len(epochs) == 0:
         return np.array([])
     sample_indices = annotation.sample * (fs // annotation.fs)
-    epoch_length = fs * epoch_duration
-    labels = np.zeros(len(epochs), dtype=int)
-    for i in range(len(epochs)):
-        start_idx = i * epoch_length
-        end_idx = start_idx + epoch_length
-        has_apnea = any(
-            (start_idx <= idx < end_idx) and (symbol == 'A')
-            for idx, symbol in zip(sample_indices, annotation.symbol)
-        )
-        labels[i] = 1 if has_apnea else 0
-    return labels
+    return label_apnea_epochs(sample_indices, annotation.symbol, len(epochs), fs, epoch_duration)
 
 
 def save_processed_data(epochs, labels, record_name):
@@ -86,21 +80,56 @@ def process_single_record(record_name):
     return None
 
 
-def process_all_records():
-    records = wfdb.get_record_list('apnea-ecg')
-    print(f"Processing {len(records)} records...")
-    results = []
-    for record in tqdm(records):
-        results.append(process_single_record(record))
+def list_local_records(raw_dir='data/raw'):
+    # Records already downloaded, i.e. with both a header and apnea annotations on disk
+    headers = glob.glob(os.path.join(raw_dir, '*.hea'))
+    records = [os.path.splitext(os.path.basename(h))[0] for h in headers]
+    return sorted(r for r in records if os.path.exists(os.path.join(raw_dir, f'{r}.apn')))
+
+
+def get_record_names(offline=False):
+    if not offline:
+        try:
+            return wfdb.get_record_list('apnea-ecg')
+        except Exception as e:
+            print(f"Could not fetch record list ({e}), falling back to local records")
+    return list_local_records()
+
+
+def process_all_records(workers=None, offline=False):
+    """
+    Preprocess every apnea-ecg record, in parallel across a process pool.
+    Each worker writes only its own data/processed/<record>_*.npy files, so no state is shared.
+
+    Args:
+    - workers: number of worker processes (default: all cores); 1 runs serially in this process
+    - offline: only process records already present in data/raw instead of fetching the record list
+    """
+    records = get_record_names(offline)
+    workers = workers or mp.cpu_count()
+    workers = min(workers, max(len(records), 1))
+    print(f"Processing {len(records)} records with {workers} worker(s)...")
+    task = partial(run_and_collect, process_single_record)
+    if workers == 1:
+        results = merge_results(task(record) for record in tqdm(records))
+    else:
+        with mp.Pool(workers) as pool:
+            results = merge_results(tqdm(pool.imap(task, records), total=len(records)))
     success = sum(1 for r in results if r)
     print(f"Processed successfully: {success}/{len(records)}")
+    write_report('data/processed/run_report.json', records=len(records), workers=workers)
+    return dict(zip(records, results))
 
 
 def combine_processed_data():
+    # Pair files by record name in sorted order so the merge is identical however the records were produced
     epochs_files = sorted(glob.glob('data/processed/*_epochs.npy'))
-    labels_files = sorted(glob.glob('data/processed/*_labels.npy'))
     all_epochs, all_labels = [], []
-    for ef, lf in zip(epochs_files, labels_files):
+    for ef in epochs_files:
+        lf = ef[:-len('_epochs.npy')] + '_labels.npy'
+        if not os.path.exists(lf):
+            print(f"Skipping {ef} - no matching labels file")
+            continue
         all_epochs.append(np.load(ef)[:, :, 0])  # Use first channel
         all_labels.append(np.load(lf))
     combined_epochs = np.concatenate(all_epochs)
@@ -121,5 +150,8 @@ def cleanup_data():
 if __name__ == "__main__":
     # Comment out cleanup_data() to keep raw data
     # cleanup_data()
-    process_all_records()
+    import sys
+    # Usage: python src/data_processing.py [workers] [--offline]
+    args = [a for a in sys.argv[1:] if a != '--offline']
+    process_all_records(workers=int(args[0]) if args else None, offline='--offline' in sys.argv)
     combine_processed_data()
\ No newline at end of file
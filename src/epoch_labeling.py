@@ -0,0 +1,47 @@
+import numpy as np
+
+
+def count_annotations_per_epoch(sample_indices, num_epochs, epoch_length):
+    """
+    Bin annotation sample indices into fixed-length epochs.
+    Returns an array of length num_epochs with the number of annotations falling in each epoch;
+    annotations outside [0, num_epochs * epoch_length) are ignored.
+    """
+    sample_indices = np.asarray(sample_indices, dtype=np.int64)
+    sample_indices = sample_indices[(sample_indices >= 0) & (sample_indices < num_epochs * epoch_length)]
+    return np.bincount(sample_indices // epoch_length, minlength=num_epochs)
+
+
+def label_apnea_epochs(sample_indices, symbols, num_epochs, fs=100, epoch_duration=60):
+    """
+    Binary labels from per-minute apnea annotations: 1 if an 'A' annotation falls inside the epoch.
+    Works for any epoch layout (60 s for the training set, 15 s for the streaming epochs).
+    """
+    apnea = np.asarray(symbols) == 'A'
+    counts = count_annotations_per_epoch(np.asarray(sample_indices)[apnea], num_epochs, fs * epoch_duration)
+    return (counts > 0).astype(int)
+
+
+def label_apnea_intervals(start_sec, end_sec, num_epochs, epoch_duration=15):
+    """
+    Three-class labels from apnea events given as (start_sec, end_sec) intervals.
+    Epochs overlapping an event are apnea (2); the epoch just before an event's start is a
+    pre-apnea warning (1) unless it is itself apnea; all others are normal (0).
+    """
+    start_epoch = (np.asarray(start_sec, dtype=float) // epoch_duration).astype(np.int64)
+    end_epoch = (np.asarray(end_sec, dtype=float) // epoch_duration).astype(np.int64) + 1  # exclusive
+
+    # Interval coverage via a difference array: +1 at each event start, -1 after its end
+    starts = np.clip(start_epoch, 0, num_epochs)
+    ends = np.clip(end_epoch, 0, num_epochs)
+    valid = starts < ends
+    delta = np.bincount(starts[valid], minlength=num_epochs + 1) - np.bincount(ends[valid], minlength=num_epochs + 1)
+    apnea = np.cumsum(delta)[:num_epochs] > 0
+
+    pre_epoch = np.maximum(start_epoch - 1, 0)
+    pre = np.bincount(pre_epoch[pre_epoch < num_epochs], minlength=num_epochs)[:num_epochs] > 0
+
+    labels = np.zeros(num_epochs, dtype=int)
+    labels[pre] = 1
+    labels[apnea] = 2
+    return labels
@@ -0,0 +1,99 @@
+import contextlib
+import os
+import time
+import numpy as np
+import pandas as pd
+
+INDEX_FILE = 'index.csv'
+INDEX_COLUMNS = ['record', 'epoch', 'offset', 'fs', 'epoch_length']
+
+
+def epochs_path(store_dir, record):
+    return os.path.join(store_dir, f'{record}_epochs.npy')
+
+
+def load_index(store_dir, record=None):
+    """
+    Load the epoch index (record, epoch, offset, fs, epoch_length), optionally for one record.
+    Epoch numbers are 1-based; offset is the first sample of the epoch within the record.
+    """
+    index_path = os.path.join(store_dir, INDEX_FILE)
+    if not os.path.exists(index_path):
+        raise FileNotFoundError(f"No epoch store index at {index_path}")
+    index = pd.read_csv(index_path, dtype={'record': str})
+    if record is not None:
+        index = index[index['record'] == record].reset_index(drop=True)
+    return index
+
+
+@contextlib.contextmanager
+def _index_lock(store_dir, timeout=60):
+    # Records may be segmented by parallel workers; the shared index is rewritten under a lock file
+    lock_path = os.path.join(store_dir, INDEX_FILE + '.lock')
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Epoch store index locked for {timeout}s; remove {lock_path} if no writer is running")
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock_path)
+
+
+def list_records(store_dir):
+    return sorted(load_index(store_dir)['record'].unique())
+
+
+def write_epoch_store(ecg_signal, record, fs=100, epoch_duration=15, store_dir='data/processed_15s_epochs'):
+    """
+    Segment a 1D signal into epochs and save them as one contiguous (n_epochs, epoch_length) array,
+    replacing any previous entries for the record in the store index.
+    Returns the number of epochs written.
+    """
+    epoch_length = fs * epoch_duration
+    num_epochs = len(ecg_signal) // epoch_length
+    os.makedirs(store_dir, exist_ok=True)
+
+    epochs = np.asarray(ecg_signal[:num_epochs * epoch_length]).reshape(num_epochs, epoch_length)
+    np.save(epochs_path(store_dir, record), epochs)
+
+    record_index = pd.DataFrame({
+        'record': record,
+        'epoch': np.arange(1, num_epochs + 1),
+        'offset': np.arange(num_epochs) * epoch_length,
+        'fs': fs,
+        'epoch_length': epoch_length
+    }, columns=INDEX_COLUMNS)
+    index_path = os.path.join(store_dir, INDEX_FILE)
+    with _index_lock(store_dir):
+        if os.path.exists(index_path):
+            index = pd.read_csv(index_path, dtype={'record': str})
+            record_index = pd.concat([index[index['record'] != record], record_index], ignore_index=True)
+        record_index.sort_values(['record', 'epoch']).to_csv(index_path + '.tmp', index=False)
+        os.replace(index_path + '.tmp', index_path)
+    return num_epochs
+
+
+def open_epochs(store_dir, record):
+    """
+    Memory-map a record's epochs read-only. Rows are epochs in order (row i is epoch i + 1),
+    so slicing returns views into the mapped file without loading the record.
+    """
+    return np.load(epochs_path(store_dir, record), mmap_mode='r')
+
+
+def read_epochs(store_dir, record, epoch_nums):
+    """
+    Fetch the requested 1-based epoch numbers that exist in the store.
+    Returns the (n_found, epoch_length) matrix and a boolean mask of which requested epochs were found.
+    """
+    epochs = open_epochs(store_dir, record)
+    epoch_nums = np.asarray(epoch_nums, dtype=int)
+    found = (epoch_nums >= 1) & (epoch_nums <= len(epochs))
+    return epochs[epoch_nums[found] - 1], found
@@ -1,12 +1,12 @@
-import pandas as pd
+from feature_store import read_labeled
 from sklearn.metrics import confusion_matrix, classification_report
 import seaborn as sns
 import matplotlib.pyplot as plt
 
 
 def main():
-    # Load CSV with features, true labels, and predicted labels
-    test_data = pd.read_csv('data/combined/features_advanced_predictions.csv')
+    # Load predicted labels of all records from the feature store, with the true labels joined
+    test_data = read_labeled('predictions', columns=['label', 'predicted_label_str'])
 
     # Extract labels
     y_true_int = test_data['label']
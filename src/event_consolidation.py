@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+from instrumentation import timed
+
+EVENT_COLUMNS = ['start_epoch', 'end_epoch', 'duration_epochs']
+
+
+def _event(status, start, end):
+    return {'status': status, 'start_epoch': start, 'end_epoch': end, 'duration_epochs': end - start + 1}
+
+
+class EventConsolidator:
+    """
+    Online grouping of alert epochs into apnea events.
+
+    An alert epoch joins the open event if it is at most max_gap epochs after the event's last
+    alert epoch; otherwise the open event is closed and a new one opened. Every update returns
+    the event changes it caused as dicts with status 'opened', 'extended' or 'closed', so the
+    cost of an update is proportional to the number of new epochs only.
+    """
+    def __init__(self, max_gap=1):
+        self.max_gap = max_gap
+        self.start = None
+        self.end = None
+
+    def update(self, epoch, is_alert):
+        updates = []
+        if is_alert:
+            if self.start is not None and epoch <= self.end + self.max_gap:
+                self.end = max(self.end, epoch)
+                updates.append(_event('extended', self.start, self.end))
+            else:
+                updates.extend(self.flush())
+                self.start = self.end = epoch
+                updates.append(_event('opened', epoch, epoch))
+        elif self.start is not None and epoch > self.end + self.max_gap:
+            updates.extend(self.flush())
+        return updates
+
+    def update_many(self, epochs, is_alert):
+        """Feed a chunk of epochs (in order) with their alert flags."""
+        updates = []
+        with timed('consolidation.online'):
+            for epoch, alert in zip(epochs, is_alert):
+                updates.extend(self.update(int(epoch), bool(alert)))
+        return updates
+
+    def flush(self):
+        """Close the open event, e.g. at the end of a recording."""
+        if self.start is None:
+            return []
+        event = _event('closed', self.start, self.end)
+        self.start = self.end = None
+        return [event]
+
+
+def consolidate_events(alert_epochs, max_gap=1):
+    """
+    Vectorized grouping of historical alert epochs into events (same semantics as EventConsolidator).
+    A new event starts wherever the distance to the previous alert epoch exceeds max_gap.
+    Returns a DataFrame with start_epoch, end_epoch, duration_epochs.
+    """
+    with timed('consolidation'):
+        return _consolidate_events(alert_epochs, max_gap)
+
+
+def _consolidate_events(alert_epochs, max_gap):
+    epochs = np.sort(np.asarray(alert_epochs, dtype=np.int64))
+    if len(epochs) == 0:
+        # Typed even when empty: an all-null column in one partition breaks reading the table
+        return pd.DataFrame({c: np.zeros(0, dtype=np.int64) for c in EVENT_COLUMNS})
+    new_event = np.concatenate(([True], np.diff(epochs) > max_gap))
+    last_in_event = np.concatenate((new_event[1:], [True]))
+    starts = epochs[new_event]
+    ends = epochs[last_in_event]
+    return pd.DataFrame({'start_epoch': starts, 'end_epoch': ends, 'duration_epochs': ends - starts + 1},
+                        columns=EVENT_COLUMNS)
@@ -0,0 +1,114 @@
+import numpy as np
+
+# Working memory per (sample, epoch) pair: float64 signal + diff, three bool masks, two int32 counters
+_BYTES_PER_CELL = 8 + 8 + 3 + 4 + 4
+
+
+def _batch_size(n_samples, max_bytes):
+    return max(1, int(max_bytes // (_BYTES_PER_CELL * n_samples)))
+
+
+def _entropy_chunk(epochs, order, r):
+    """
+    Lag-wise template matching for one chunk of epochs.
+    For every lag k the absolute differences x[i] - x[i+k] are computed once for the whole chunk,
+    and runs of `order` consecutive matches mark matching templates (Chebyshev distance).
+    Approximate entropy counts matches with distance <= r (as sklearn's KDTree does),
+    sample entropy with distance < r (as antropy's numba kernel does).
+    """
+    n_epochs, n = epochs.shape
+    xt = np.ascontiguousarray(epochs.T)  # (n_samples, n_epochs): lag slices are contiguous
+    n1 = n - order + 1
+    n2 = n - order
+
+    count1 = np.ones((n1, n_epochs), dtype=np.int32)  # each template matches itself
+    count2 = np.ones((n2, n_epochs), dtype=np.int32)
+    matches_m = np.zeros(n_epochs, dtype=np.int64)
+    matches_m1 = np.zeros(n_epochs, dtype=np.int64)
+
+    diff = np.empty((n, n_epochs))
+    within_le = np.empty((n, n_epochs), dtype=bool)
+    within_lt = np.empty((n, n_epochs), dtype=bool)
+    run = np.empty((n, n_epochs), dtype=bool)
+
+    for k in range(1, n1):
+        length = n - k
+        d = diff[:length]
+        np.subtract(xt[:length], xt[k:], out=d)
+        np.abs(d, out=d)
+
+        # Approximate entropy: per-template neighbour counts, both directions of each pair
+        le = within_le[:length]
+        np.less_equal(d, r, out=le)
+        w1 = n1 - k
+        m1 = run[:w1]
+        np.copyto(m1, le[:w1])
+        for t in range(1, order):
+            m1 &= le[t:t + w1]
+        count1[:w1] += m1
+        count1[k:] += m1
+
+        if k >= n2:
+            continue
+        w2 = n2 - k
+        m2 = m1[:w2] & le[order:order + w2]
+        count2[:w2] += m2
+        count2[k:] += m2
+
+        # Sample entropy: pair counts over the first n - order templates, self-matches excluded
+        lt = within_lt[:length]
+        np.less(d, r, out=lt)
+        ms = run[:w2]
+        np.copyto(ms, lt[:w2])
+        for t in range(1, order):
+            ms &= lt[t:t + w2]
+        matches_m += np.count_nonzero(ms, axis=0)
+        ms &= lt[order:order + w2]
+        matches_m1 += np.count_nonzero(ms, axis=0)
+
+    app_en = np.log(count1 / n1).mean(axis=0) - np.log(count2 / n2).mean(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        samp_en = -np.log(matches_m1 / matches_m)
+    return app_en, samp_en
+
+
+def batch_entropy(epochs, order=2, tolerance=0.2, max_bytes=64 * 1024 ** 2):
+    """
+    Approximate and sample entropy for a (n_epochs, n_samples) matrix.
+
+    Args:
+    - epochs: 2D array, one epoch per row (a 1D array is treated as a single epoch)
+    - order: embedding dimension
+    - tolerance: r as a fraction of each epoch's standard deviation
+    - max_bytes: cap on working memory; epochs are processed in chunks that fit
+
+    Returns:
+    - app_en, samp_en: float arrays of length n_epochs
+    - failed: boolean mask of epochs whose entropy is undefined (flat signal or no matching
+      templates); their entries are NaN rather than a silent placeholder
+    """
+    epochs = np.asarray(epochs, dtype=np.float64)
+    if epochs.ndim == 1:
+        epochs = epochs[np.newaxis, :]
+    if epochs.ndim != 2:
+        raise ValueError(f"Expected a (n_epochs, n_samples) matrix, got shape {epochs.shape}")
+    n_epochs, n = epochs.shape
+    if n <= order + 1:
+        raise ValueError(f"Epochs of {n} samples are too short for order={order}")
+
+    app_en = np.full(n_epochs, np.nan)
+    samp_en = np.full(n_epochs, np.nan)
+    r = tolerance * np.std(epochs, axis=1)
+    valid = np.isfinite(epochs).all(axis=1) & (r > 0)
+
+    idx = np.flatnonzero(valid)
+    step = _batch_size(n, max_bytes)
+    for start in range(0, len(idx), step):
+        chunk = idx[start:start + step]
+        app_en[chunk], samp_en[chunk] = _entropy_chunk(epochs[chunk], order, r[chunk])
+
+    failed = ~valid | ~np.isfinite(app_en) | ~np.isfinite(samp_en)
+    app_en[failed] = np.nan
+    samp_en[failed] = np.nan
+    return app_en, samp_en, failed
+
@@ -0,0 +1,130 @@
+import hashlib
+import os
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+
+FEATURE_CACHE_PATH = 'data/feature_cache.sqlite'
+MAX_CACHE_ENTRIES = 2_000_000  # ~100 MB of 12-feature float32 rows plus keys
+_QUERY_CHUNK = 500  # keys per IN (...) query, below SQLite's bound-parameter limit
+
+
+def epoch_keys(epochs, extractor, version, fs):
+    """
+    One cache key per epoch: a hash of its samples (as float64) together with the extractor
+    name, its version and the sampling rate, so changing any of them misses the cache.
+    """
+    epochs = np.ascontiguousarray(epochs, dtype=np.float64)
+    prefix = f'{extractor}:{version}:{fs}:{epochs.shape[1]}:'.encode()
+    return [hashlib.blake2b(prefix + row.tobytes(), digest_size=16).digest() for row in epochs]
+
+
+class FeatureCache:
+    """
+    Per-epoch feature rows keyed by content hash, kept in a SQLite file.
+
+    Entries remember when they were last read or written; once the cache holds more than
+    max_entries rows the least recently used ones are dropped. hits/misses count lookups made
+    through this instance.
+    """
+    def __init__(self, path=FEATURE_CACHE_PATH, max_entries=MAX_CACHE_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS features (key BLOB PRIMARY KEY, value BLOB, used INTEGER)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS features_used ON features (used)')
+        self.conn.commit()
+
+    def get_many(self, keys, n_features):
+        """
+        Look up keys. Returns a (len(keys), n_features) float32 matrix and a boolean mask of hits;
+        rows that missed are NaN.
+        """
+        values = np.full((len(keys), n_features), np.nan, dtype=np.float32)
+        position = {key: i for i, key in enumerate(keys)}
+        found = np.zeros(len(keys), dtype=bool)
+        unique = list(position)
+        for start in range(0, len(unique), _QUERY_CHUNK):
+            chunk = unique[start:start + _QUERY_CHUNK]
+            rows = self.conn.execute(
+                f'SELECT key, value FROM features WHERE key IN ({",".join("?" * len(chunk))})', chunk)
+            for key, value in rows:
+                row = np.frombuffer(value, dtype=np.float32)
+                if len(row) == n_features:
+                    values[position[key]] = row
+                    found[position[key]] = True
+        # Identical epochs share a key; copy the looked-up row to every occurrence
+        for i, key in enumerate(keys):
+            if not found[i] and found[position[key]]:
+                values[i] = values[position[key]]
+                found[i] = True
+
+        hit_keys = [key for key, hit in zip(keys, found) if hit]
+        now = time.time_ns()
+        self.conn.executemany('UPDATE features SET used = ? WHERE key = ?', [(now, key) for key in set(hit_keys)])
+        self.conn.commit()
+        self.hits += int(found.sum())
+        self.misses += int((~found).sum())
+        return values, found
+
+    def put_many(self, keys, values):
+        values = np.ascontiguousarray(values, dtype=np.float32)
+        now = time.time_ns()
+        self.conn.executemany('INSERT OR REPLACE INTO features (key, value, used) VALUES (?, ?, ?)',
+                              [(key, row.tobytes(), now) for key, row in zip(keys, values)])
+        self.conn.commit()
+        self.evict()
+
+    def evict(self):
+        if self.max_entries is None:
+            return 0
+        excess = self.conn.execute('SELECT COUNT(*) FROM features').fetchone()[0] - self.max_entries
+        if excess <= 0:
+            return 0
+        self.conn.execute('DELETE FROM features WHERE key IN (SELECT key FROM features ORDER BY used LIMIT ?)', (excess,))
+        self.conn.commit()
+        self.evictions += excess
+        return excess
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else None,
+            'evictions': self.evictions,
+            'entries': self.conn.execute('SELECT COUNT(*) FROM features').fetchone()[0]
+        }
+
+    def close(self):
+        self.conn.close()
+
+
+def cached_features(epochs, extract_fn, columns, cache, extractor, version, fs=100):
+    """
+    Features for a (n_epochs, n_samples) matrix, computing only the epochs the cache does not
+    know. extract_fn(missed_epochs) must return a DataFrame with `columns`.
+    Returns a float32 DataFrame in epoch order; without a cache everything is computed.
+    """
+    epochs = np.asarray(epochs, dtype=np.float64)
+    if cache is None:
+        return extract_fn(epochs)[columns].astype(np.float32).reset_index(drop=True)
+
+    keys = epoch_keys(epochs, extractor, version, fs)
+    values, found = cache.get_many(keys, len(columns))
+    if not found.all():
+        missed = np.flatnonzero(~found)
+        computed = extract_fn(epochs[missed])[columns].to_numpy(dtype=np.float32)
+        values[missed] = computed
+        cache.put_many([keys[i] for i in missed], computed)
+    return pd.DataFrame(values, columns=columns)
+
+
+if __name__ == "__main__":
+    cache = FeatureCache()
+    print(cache.stats())
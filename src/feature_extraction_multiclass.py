@@ -1,7 +1,14 @@
 import numpy as np
 import pandas as pd
-import os
 from scipy.stats import skew, kurtosis
+from epoch_store import open_epochs
+from feature_store import write_partition
+from feature_cache import FeatureCache, cached_features
+
+FEATURE_COLUMNS = ['mean', 'std', 'min', 'max', 'median', 'skewness', 'kurtosis']
+
+# Bump whenever a feature definition changes, so cached feature rows are recomputed
+FEATURE_EXTRACTOR_VERSION = 1
 
 def extract_features_from_epoch(epoch_signal):
     features = {}
@@ -14,32 +21,21 @@ def extract_features_from_epoch(epoch_signal):
     features['kurtosis'] = kurtosis(epoch_signal)
     return features
 
-def extract_features_for_all_epochs(epochs_dir, labels_csv, output_csv='data/combined/features_multiclass.csv'):
-    # Load labels
-    labels_df = pd.read_csv(labels_csv)
-    
-    feature_list = []
-    for idx, row in labels_df.iterrows():
-        epoch_num = row['epoch']
-        label = row['label']
-        epoch_path = os.path.join(epochs_dir, f'epoch_{epoch_num}.npy')
-        
-        if not os.path.exists(epoch_path):
-            print(f"Epoch file {epoch_path} missing, skipping.")
-            continue
-        
-        epoch_signal = np.load(epoch_path)
-        feats = extract_features_from_epoch(epoch_signal)
-        feats['label'] = label
-        feats['epoch'] = epoch_num
-        
-        feature_list.append(feats)
+def extract_features_for_epochs(epochs):
+    return pd.DataFrame([extract_features_from_epoch(epoch_signal) for epoch_signal in epochs], columns=FEATURE_COLUMNS)
+
+def extract_features_for_all_epochs(epochs_dir, record='x01', cache=None):
+    # Every epoch of the record; labels are joined when the features_multiclass table is read
+    epochs = open_epochs(epochs_dir, record)
+    features_df = cached_features(epochs, extract_features_for_epochs, FEATURE_COLUMNS,
+                                  cache, 'multiclass', FEATURE_EXTRACTOR_VERSION)
+    features_df['epoch'] = np.arange(1, len(epochs) + 1)
 
-    features_df = pd.DataFrame(feature_list)
-    features_df.to_csv(output_csv, index=False)
-    print(f"Extracted features with labels saved to {output_csv}")
+    path = write_partition(features_df, 'features_multiclass', record)
+    print(f"Extracted features saved to {path}")
+    if cache is not None:
+        print(f"Feature cache: {cache.stats()}")
 
 if __name__ == "__main__":
     epochs_directory = 'data/processed_15s_epochs'
-    label_file = 'data/epoch_labels.csv'
-    extract_features_for_all_epochs(epochs_directory, label_file)
\ No newline at end of file
+    extract_features_for_all_epochs(epochs_directory, cache=FeatureCache())
\ No newline at end of file
@@ -0,0 +1,109 @@
+import os
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+FEATURE_STORE_DIR = 'data/feature_store'
+
+# Tables that replace the CSV intermediates:
+#   labels        (epoch_labels.csv)                   epoch, label
+#   features      (features_advanced.csv)              FEATURE_COLUMNS, epoch
+#   features_multiclass (features_multiclass.csv)      time-domain features, epoch
+#   predictions   (features_advanced_predictions.csv)  features + predicted_label(_str), predicted_prob
+# Feature rows carry no labels; join_labels() attaches them when a table is read.
+#   batch_results (batch_inference_results.csv)        epoch, label, probability
+#   events        (consolidated_xgboost_alerts.csv)    start_epoch, end_epoch, duration_epochs
+
+
+def partition_path(table, record, store_dir=FEATURE_STORE_DIR):
+    # Hive-style partitions, so a dataset scan yields the record as a column
+    return os.path.join(store_dir, table, f'record={record}', 'part-0.parquet')
+
+
+def _compact(df):
+    # Features and probabilities are stored as float32: half the size, and what the models score
+    df = df.drop(columns=['record'], errors='ignore')
+    floats = df.select_dtypes(include=['float64']).columns
+    return df.astype({c: np.float32 for c in floats})
+
+
+def write_partition(df, table, record, store_dir=FEATURE_STORE_DIR):
+    """
+    Replace one record's partition of a table. The file is written next to its final path and
+    renamed into place, so readers never see a partial partition.
+    """
+    path = partition_path(table, record, store_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    pq.write_table(pa.Table.from_pandas(_compact(df), preserve_index=False), tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def list_records(table, store_dir=FEATURE_STORE_DIR):
+    table_dir = os.path.join(store_dir, table)
+    if not os.path.isdir(table_dir):
+        return []
+    return sorted(name.split('=', 1)[1] for name in os.listdir(table_dir)
+                  if name.startswith('record=') and os.path.exists(os.path.join(table_dir, name, 'part-0.parquet')))
+
+
+def read_table(table, columns=None, records=None, filters=None, store_dir=FEATURE_STORE_DIR):
+    """
+    Read a table (all records, or the given ones) into a DataFrame.
+
+    Only the requested columns are decoded, and `filters` (pyarrow (column, op, value) tuples,
+    e.g. [('predicted_label', 'in', [1, 2])]) are applied while scanning, so reading the alert
+    epochs of a night never materializes its feature columns. The record partition key comes
+    back as a column when it is requested (or when no columns are given).
+    """
+    records = list_records(table, store_dir) if records is None else list(records)
+    paths = [partition_path(table, r, store_dir) for r in records]
+    missing = [p for p in paths if not os.path.exists(p)]
+    if missing:
+        raise FileNotFoundError(f"No {table} partition at {missing[0]}")
+    if not paths:
+        raise FileNotFoundError(f"No {table} table in {store_dir}")
+
+    partitioning = ds.partitioning(pa.schema([('record', pa.string())]), flavor='hive')
+    dataset = ds.dataset(paths, format='parquet', partitioning=partitioning,
+                         partition_base_dir=os.path.join(store_dir, table))
+    expression = pq.filters_to_expression(filters) if filters else None
+    columns = list(columns) if columns is not None else None
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def join_labels(df, store_dir=FEATURE_STORE_DIR):
+    """
+    Attach the current labels to rows with record and epoch columns. Rows without a label
+    (e.g. epochs of an unannotated record) are dropped.
+    """
+    labels = read_table('labels', columns=['record', 'epoch', 'label'],
+                        records=df['record'].unique(), store_dir=store_dir)
+    return df.merge(labels, on=['record', 'epoch'], how='inner')
+
+
+def read_labeled(table, columns=None, records=None, store_dir=FEATURE_STORE_DIR):
+    """read_table() with the label column joined from the labels table."""
+    if columns is not None:
+        columns = [c for c in columns if c != 'label'] + [c for c in ('record', 'epoch') if c not in columns]
+    df = read_table(table, columns=columns, records=records, store_dir=store_dir)
+    return join_labels(df, store_dir)
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2:
+        print("Usage: python src/feature_store.py <table> [output_csv]")
+        exit(1)
+
+    # Inspect a table, or export it to CSV for tools that still expect one
+    df = read_table(sys.argv[1])
+    if len(sys.argv) > 2:
+        df.to_csv(sys.argv[2], index=False)
+        print(f"Exported {len(df)} rows to {sys.argv[2]}")
+    else:
+        print(df.dtypes)
+        print(df.head())
+        print(f"{len(df)} rows in {df['record'].nunique()} records")
@@ -0,0 +1,329 @@
+import hashlib
+import json
+import math
+import multiprocessing as mp
+import os
+import sys
+import time
+from functools import partial
+import joblib
+import numpy as np
+import xgboost as xgb
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import f1_score, log_loss
+from sklearn.utils.class_weight import compute_class_weight
+from predictor import LABEL_MAP, save_feature_schema
+from model_registry import publish_model
+from cross_validation import N_SPLITS, fit_model, grouped_folds, labeled_matrix, oversample
+from instrumentation import timed, write_report, run_and_collect, merge_results
+
+SEARCH_DIR = 'models/search'  # <model>/trials.jsonl, best.json, best_model.pkl
+EARLY_STOPPING_ROUNDS = 20
+RF_STEP = 50  # trees added per early-stopping check
+MAX_BIN = 256
+
+# ('int', lo, hi) and ('uniform', lo, hi) are sampled uniformly, ('log', lo, hi) log-uniformly
+SEARCH_SPACES = {
+    'xgboost': {
+        'max_depth': ('int', 3, 10),
+        'learning_rate': ('log', 0.01, 0.3),
+        'subsample': ('uniform', 0.5, 1.0),
+        'colsample_bytree': ('uniform', 0.5, 1.0),
+        'min_child_weight': ('log', 1.0, 20.0),
+        'reg_lambda': ('log', 0.1, 10.0),
+    },
+    'rf': {
+        'max_depth': ('choice', [None, 8, 16, 32]),
+        'min_samples_leaf': ('int', 1, 20),
+        'max_features': ('choice', ['sqrt', 'log2', 0.5, 1.0]),
+        'class_weight': ('choice', [None, 'balanced', 'balanced_subsample']),
+    },
+}
+# Budget of a trial: boosting rounds for XGBoost, trees for RF (both cut short by early stopping)
+BUDGETS = {'xgboost': (30, 810), 'rf': (50, 450)}
+
+# Set in each worker by _init_worker; fold matrices are built on first use and kept for every
+# later trial in that worker
+_X = None
+_y = None
+_folds = None
+_smote = True
+_fold_data = {}
+
+
+def sample_params(space, rng):
+    params = {}
+    for name, (kind, *args) in space.items():
+        if kind == 'int':
+            params[name] = int(rng.integers(args[0], args[1] + 1))
+        elif kind == 'uniform':
+            params[name] = float(rng.uniform(args[0], args[1]))
+        elif kind == 'log':
+            params[name] = float(math.exp(rng.uniform(math.log(args[0]), math.log(args[1]))))
+        else:
+            params[name] = args[0][rng.integers(len(args[0]))]
+    return params
+
+
+def data_fingerprint(X, y, folds, smote):
+    # Part of every trial key: results computed on other data or folds are never reused
+    h = hashlib.blake2b(digest_size=8)
+    h.update(np.ascontiguousarray(X, dtype=np.float32).tobytes())
+    h.update(np.asarray(y, dtype=np.int64).tobytes())
+    for _, _, test in folds:
+        h.update(np.asarray(test, dtype=np.int64).tobytes())
+    h.update(str(smote).encode())
+    return h.hexdigest()
+
+
+def trial_key(model_name, params, budget, fingerprint):
+    payload = json.dumps([model_name, params, budget, fingerprint], sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def _init_worker(X, y, folds, smote):
+    global _X, _y, _folds, _smote, _fold_data
+    _X, _y, _folds, _smote, _fold_data = X, y, folds, smote, {}
+
+
+def fold_data(number, model_name):
+    """
+    One fold's training rows (SMOTE applied) and validation rows, built once per worker. For
+    XGBoost both sides are QuantileDMatrix, the validation one sharing the training bin edges.
+    """
+    key = (number, model_name)
+    if key not in _fold_data:
+        _, train_idx, valid_idx = _folds[number]
+        X_train, y_train = _X[train_idx], _y[train_idx]
+        if _smote:
+            X_train, y_train = oversample(X_train, y_train)
+        if model_name == 'xgboost':
+            dtrain = xgb.QuantileDMatrix(X_train, y_train, max_bin=MAX_BIN)
+            dvalid = xgb.QuantileDMatrix(_X[valid_idx], _y[valid_idx], ref=dtrain)
+            _fold_data[key] = (dtrain, dvalid, _y[valid_idx])
+        else:
+            _fold_data[key] = (X_train, y_train, _X[valid_idx], _y[valid_idx])
+    return _fold_data[key]
+
+
+def _xgboost_fold(number, params, budget, n_jobs):
+    dtrain, dvalid, y_valid = fold_data(number, 'xgboost')
+    booster = xgb.train(
+        {**params, 'objective': 'multi:softprob', 'num_class': len(LABEL_MAP), 'tree_method': 'hist',
+         'max_bin': MAX_BIN, 'eval_metric': 'mlogloss', 'nthread': n_jobs, 'seed': 42},
+        dtrain, num_boost_round=budget, evals=[(dvalid, 'valid')],
+        early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=False)
+    rounds = booster.best_iteration + 1
+    proba = booster.predict(dvalid, iteration_range=(0, rounds))
+    return proba, y_valid, rounds
+
+
+def _rf_forests(params, X_train, y_train, X_valid, budget, n_jobs):
+    """Classes and validation probabilities of the forest's first RF_STEP, 2 * RF_STEP, ... trees."""
+    steps = range(min(RF_STEP, budget), budget + 1, RF_STEP)
+    if params.get('class_weight') == 'balanced_subsample':
+        # Weights are recomputed for every bootstrap sample, which warm start cannot do: grow all
+        # the trees in one fit and average the predictions of the first n
+        clf = RandomForestClassifier(**params, n_estimators=steps[-1], random_state=42, n_jobs=n_jobs)
+        clf.fit(X_train, y_train)
+        total = 0
+        for n_trees, tree in enumerate(clf.estimators_, 1):
+            total = total + tree.predict_proba(X_valid)
+            if n_trees in steps:
+                yield n_trees, clf.classes_, total / n_trees
+        return
+    if params.get('class_weight') == 'balanced':
+        # The same weights, computed once: warm start would not recompute them for the added trees
+        classes = np.unique(y_train)
+        weights = compute_class_weight('balanced', classes=classes, y=y_train)
+        params = {**params, 'class_weight': dict(zip(classes.tolist(), weights))}
+    clf = RandomForestClassifier(**params, n_estimators=0, warm_start=True, random_state=42, n_jobs=n_jobs)
+    for n_trees in steps:
+        clf.set_params(n_estimators=n_trees)
+        clf.fit(X_train, y_train)
+        yield n_trees, clf.classes_, clf.predict_proba(X_valid)
+
+
+def _rf_fold(number, params, budget, n_jobs):
+    # Trees are added RF_STEP at a time until the validation loss stops improving
+    X_train, y_train, X_valid, y_valid = fold_data(number, 'rf')
+    best = (np.inf, None, 0)
+    for n_trees, classes, class_proba in _rf_forests(params, X_train, y_train, X_valid, budget, n_jobs):
+        proba = np.zeros((len(X_valid), len(LABEL_MAP)))
+        proba[:, classes] = class_proba
+        loss = log_loss(y_valid, proba, labels=list(LABEL_MAP))
+        if loss < best[0]:
+            best = (loss, proba, n_trees)
+        elif n_trees - best[2] >= 2 * RF_STEP:
+            break
+    return best[1], y_valid, best[2]
+
+
+def run_trial(trial, n_jobs):
+    """Evaluate one configuration on every fold. Returns the trial with per-fold and mean scores."""
+    start = time.perf_counter()
+    fold_fn = _xgboost_fold if trial['model'] == 'xgboost' else _rf_fold
+    folds = []
+    for number in range(len(_folds)):
+        with timed(f'search.{trial["model"]}'):
+            proba, y_valid, rounds = fold_fn(number, trial['params'], trial['budget'], n_jobs)
+        folds.append({
+            'fold': number,
+            'macro_f1': float(f1_score(y_valid, proba.argmax(axis=1), labels=list(LABEL_MAP), average='macro',
+                                       zero_division=0)),
+            'logloss': float(log_loss(y_valid, proba, labels=list(LABEL_MAP))),
+            'rounds': int(rounds)
+        })
+    return {
+        **trial,
+        'folds': folds,
+        'macro_f1': float(np.mean([f['macro_f1'] for f in folds])),
+        'logloss': float(np.mean([f['logloss'] for f in folds])),
+        'rounds': int(round(np.mean([f['rounds'] for f in folds]))),
+        'seconds': round(time.perf_counter() - start, 3)
+    }
+
+
+def load_trials(path):
+    """Completed trials by key; a partially written last line (interrupted run) is ignored."""
+    done = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    trial = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                done[trial['key']] = trial
+    return done
+
+
+def _rank(trials):
+    # Best first: macro F1 over the folds, validation log loss breaking ties
+    return sorted(trials, key=lambda t: (-t['macro_f1'], t['logloss']))
+
+
+def search(X, y, groups, model_name='xgboost', mode='halving', n_trials=27, eta=3, n_splits=N_SPLITS, smote=True,
+           workers=None, seed=42, search_dir=SEARCH_DIR):
+    """
+    Hyperparameter search over SEARCH_SPACES[model_name], scored by grouped K-fold by record.
+
+    Params:
+      - mode: 'random' runs every sampled configuration at the full budget; 'halving' (successive
+        halving) starts them all at the smallest budget and keeps the best 1/eta for each
+        eta-times larger budget
+      - smote: oversample each training fold (never the validation rows)
+      - workers: trials evaluated in parallel; each worker builds its fold matrices once
+    Every finished trial is appended to <search_dir>/<model>/trials.jsonl as it completes.
+    Configurations are drawn from `seed`, so running the same search again skips the trials
+    already in that file and resumes where it stopped.
+    Returns:
+      - the trials of the last rung, best first
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    y = np.asarray(y, dtype=np.int64)
+    folds = grouped_folds(groups, n_splits)
+    fingerprint = data_fingerprint(X, y, folds, smote)
+    min_budget, max_budget = BUDGETS[model_name]
+    if mode == 'halving':
+        budgets = [min(min_budget * eta ** k, max_budget) for k in range(int(math.log(max_budget / min_budget, eta) + 1e-9) + 1)]
+    else:
+        budgets = [max_budget]
+
+    out_dir = os.path.join(search_dir, model_name)
+    os.makedirs(out_dir, exist_ok=True)
+    trials_path = os.path.join(out_dir, 'trials.jsonl')
+    done = load_trials(trials_path)
+    if os.path.exists(trials_path) and os.path.getsize(trials_path):
+        with open(trials_path, 'rb+') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')  # end a line cut off by an interrupted run before appending
+
+    rng = np.random.default_rng(seed)
+    configs = [sample_params(SEARCH_SPACES[model_name], rng) for _ in range(n_trials)]
+    workers = min(workers or mp.cpu_count(), n_trials)
+    n_jobs = max(mp.cpu_count() // workers, 1)
+    print(f"{mode} search of {model_name}: {n_trials} configurations, budgets {budgets}, "
+          f"{len(folds)} folds, {workers} worker(s) x {n_jobs} thread(s)")
+
+    task = partial(run_and_collect, run_trial, n_jobs=n_jobs)
+    start = time.perf_counter()
+    pool = mp.Pool(workers, initializer=_init_worker, initargs=(X, y, folds, smote)) if workers > 1 else None
+    if pool is None:
+        _init_worker(X, y, folds, smote)
+    try:
+        for rung, budget in enumerate(budgets):
+            trials = [{'key': trial_key(model_name, params, budget, fingerprint), 'model': model_name,
+                       'params': params, 'budget': budget, 'rung': rung} for params in configs]
+            todo = [t for t in trials if t['key'] not in done]
+            print(f"Rung {rung}: {len(trials)} configurations at budget {budget} "
+                  f"({len(trials) - len(todo)} already done)")
+            results = pool.imap_unordered(task, todo) if pool else (task(t) for t in todo)
+            with open(trials_path, 'a') as f:
+                for result in merge_results(_flushed(results, f)):
+                    done[result['key']] = result
+            ranked = _rank([done[t['key']] for t in trials])
+            if rung < len(budgets) - 1:
+                keep = max(len(ranked) // eta, 1)
+                configs = [t['params'] for t in ranked[:keep]]
+                if keep == 1 and ranked[0]['rounds'] < budget:
+                    break  # a lone survivor that stopped early gains nothing from a larger budget
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    elapsed = time.perf_counter() - start
+    for t in ranked[:5]:
+        print(f"macro_f1={t['macro_f1']:.4f} logloss={t['logloss']:.4f} rounds={t['rounds']} {t['params']}")
+    print(f"Search finished in {elapsed:.1f}s; trials saved to {trials_path}")
+    write_report(os.path.join(out_dir, 'run_report.json'), model=model_name, mode=mode, trials=n_trials,
+                 workers=workers, seconds=round(elapsed, 3))
+    return ranked
+
+
+def _flushed(results, f):
+    # Persist each trial as soon as it finishes, so an interrupted search loses at most the running ones
+    for result, snap in results:
+        f.write(json.dumps(result) + '\n')
+        f.flush()
+        yield result, snap
+
+
+def save_best(best, X, y, feature_names, smote=True, search_dir=SEARCH_DIR, publish=False):
+    """
+    Refit the best configuration on every record (with its early-stopped number of rounds or
+    trees) and save it with its trial next to the search results.
+    """
+    out_dir = os.path.join(search_dir, best['model'])
+    model = fit_model(best['model'], X, y, smote=smote, n_jobs=-1, **best['params'], n_estimators=best['rounds'])
+    model_path = os.path.join(out_dir, 'best_model.pkl')
+    joblib.dump(model, model_path)
+    save_feature_schema(model_path, feature_names)
+    with open(os.path.join(out_dir, 'best.json'), 'w') as f:
+        json.dump(best, f, indent=2)
+    print(f"Best model saved to {model_path}")
+    if publish and best['model'] == 'xgboost':
+        publish_model(model, 'xgboost_balanced', feature_names)
+    return model_path
+
+
+if __name__ == "__main__":
+    # Usage: python src/hyperparameter_search.py [--model xgboost|rf] [--table features] [--mode halving|random]
+    #            [--trials N] [--folds K] [--workers N] [--no-smote] [--publish] [record ...]
+    args = sys.argv[1:]
+    options = {'--model': 'xgboost', '--table': 'features', '--mode': 'halving', '--trials': 27,
+               '--folds': N_SPLITS, '--workers': None}
+    for name in options:
+        if name in args:
+            i = args.index(name)
+            options[name] = args[i + 1]
+            del args[i:i + 2]
+    flags = {a for a in args if a.startswith('--')}
+    records = [a for a in args if not a.startswith('--')] or None
+    X, y, groups = labeled_matrix(options['--table'], records)
+    ranked = search(X, y, groups, options['--model'], options['--mode'], int(options['--trials']),
+                    n_splits=int(options['--folds']), smote='--no-smote' not in flags,
+                    workers=int(options['--workers']) if options['--workers'] else None)
+    save_best(ranked[0], X, y, X.columns, smote='--no-smote' not in flags, publish='--publish' in flags)
@@ -1,44 +1,43 @@
 # src/inference.py
 import numpy as np
-import pandas as pd
-import joblib
-from scipy.signal import resample, butter, filtfilt
+from resampling import resample_signal
+from signal_filters import bandpass_filter, bandpass_filter_chunked
+from predictor import Predictor
 
 MODEL_PATH = '../models/apnea_model.pkl'
+FEATURE_COLUMNS = ['mean', 'std', 'min', 'max', 'median', 'p25', 'p75']
 
 def preprocess_signal(signal, target_fs=100):
     fs_orig = 100  # Adjust if original frequency differs
     if fs_orig != target_fs:
-        signal = resample(signal, int(len(signal) * target_fs / fs_orig))
-    b, a = butter(4, [0.5, 40], btype='bandpass', fs=target_fs)
-    filtered = filtfilt(b, a, signal)
+        signal = resample_signal(signal, fs_orig, target_fs)
+    filtered = bandpass_filter(signal, target_fs)
     normalized = (filtered - np.mean(filtered)) / np.std(filtered)
     return normalized
 
+def preprocess_record_epochs(epochs, fs=100):
+    """
+    Filter consecutive epochs of one record as a continuous signal (block-wise, zero-phase),
+    then normalize each epoch. Unlike preprocess_signal on isolated epochs, this has no
+    filter transients at epoch boundaries.
+    """
+    filtered = bandpass_filter_chunked(np.asarray(epochs).reshape(-1), fs).reshape(len(epochs), -1)
+    mean = filtered.mean(axis=1, keepdims=True)
+    std = filtered.std(axis=1, keepdims=True)
+    return (filtered - mean) / std
+
 def extract_features(epoch):
-    features = [
-        np.mean(epoch),
-        np.std(epoch),
-        np.min(epoch),
-        np.max(epoch),
-        np.median(epoch),
-        np.percentile(epoch, 25),
-        np.percentile(epoch, 75)
-    ]
-    columns = ['mean', 'std', 'min', 'max', 'median', 'p25', 'p75']
-    df_features = pd.DataFrame([features], columns=columns)
-    return df_features
+    # One row in FEATURE_COLUMNS order
+    p25, median, p75 = np.percentile(epoch, [25, 50, 75])
+    return np.array([[np.mean(epoch), np.std(epoch), np.min(epoch), np.max(epoch), median, p25, p75]],
+                    dtype=np.float32)
 
 def load_model(path=MODEL_PATH):
-    model = joblib.load(path)
-    print(f"Loaded model from {path}")
-    return model
+    return Predictor.load(path)
 
 def predict_apnea(model, signal_epoch):
-    features = extract_features(signal_epoch)
-    pred_prob = model.predict_proba(features)[0,1]
-    pred_label = model.predict(features)[0]
-    return pred_label, pred_prob
+    labels, proba = model.predict(extract_features(signal_epoch))
+    return labels[0], proba[0, 1]
 
 if __name__ == "__main__":
     import sys
@@ -1,31 +1,29 @@
 import numpy as np
-import os
-import joblib
-import pandas as pd
 from scipy.stats import skew, kurtosis
+from predictor import Predictor
+# Column order the multiclass model was trained on; extract_features follows it
+from feature_extraction_multiclass import FEATURE_COLUMNS
 
 def load_model(path='models/multiclass_rf_model.pkl'):
-    model = joblib.load(path)
-    print(f"Loaded model from {path}")
-    return model
+    return Predictor.load(path)
+
+EPOCH_STATISTICS = {
+    'mean': np.mean,
+    'std': np.std,
+    'min': np.min,
+    'max': np.max,
+    'median': np.median,
+    'skewness': skew,
+    'kurtosis': kurtosis
+}
 
 def extract_features(epoch_signal):
-    features = {
-        'mean': np.mean(epoch_signal),
-        'std': np.std(epoch_signal),
-        'min': np.min(epoch_signal),
-        'max': np.max(epoch_signal),
-        'median': np.median(epoch_signal),
-        'skewness': skew(epoch_signal),
-        'kurtosis': kurtosis(epoch_signal)
-    }
-    return pd.DataFrame([features])
+    # One row, in FEATURE_COLUMNS order
+    return np.array([[EPOCH_STATISTICS[f](epoch_signal) for f in FEATURE_COLUMNS]], dtype=np.float32)
   
 def predict_epoch(model, epoch_array):
-    features = extract_features(epoch_array)
-    pred_label = model.predict(features)[0]
-    pred_prob = model.predict_proba(features).max()
-    return pred_label, pred_prob
+    labels, proba = model.predict(extract_features(epoch_array))
+    return labels[0], proba[0].max()
 
 if __name__ == "__main__":
     import sys
@@ -1,39 +1,42 @@
 import pandas as pd
-import joblib
 import numpy as np
+from predictor import Predictor, LABEL_MAP
+from feature_store import list_records, read_table, write_partition
 
 def load_model(path='models/xgboost_balanced_model.pkl'):
-    model = joblib.load(path)
-    print(f"Loaded model from {path}")
-    return model
+    return Predictor.load(path)
 
 def predict_epoch(model, features_df):
-    X = features_df.drop(['label', 'epoch'], axis=1, errors='ignore')
-    preds = model.predict(X)
-    pred_probs = model.predict_proba(X)
+    # Columns are selected and ordered by the model's feature schema
+    X = features_df.drop(['label', 'epoch', 'record'], axis=1, errors='ignore')
+    preds, pred_probs = model.predict(X)
     return preds, pred_probs
 
+def predict_record(model, record):
+    """Score one record of the features table and store it as the record's predictions partition."""
+    # Project only the columns the model needs, read straight into float32
+    columns = (model.feature_names or []) + ['epoch']
+    df = read_table('features', columns=columns if model.feature_names else None, records=[record])
+    preds, pred_probs = predict_epoch(model, df)
+
+    df['predicted_label'] = preds
+    df['predicted_label_str'] = df['predicted_label'].map(LABEL_MAP)
+    df['predicted_prob'] = pred_probs.max(axis=1)
+    path = write_partition(df, 'predictions', record)
+    print(f"Predictions for {record} saved to {path}")
+    return df
+
 if __name__ == "__main__":
     import sys
-    if len(sys.argv) < 2:
-        print("Usage: python src/inference_xgboost_balanced.py <features_csv>")
+
+    # Records to score (default: every record in the features table)
+    records = sys.argv[1:] or list_records('features')
+    if not records:
+        print("Usage: python src/inference_xgboost_balanced.py [record ...]  (no features in the store yet)")
         exit(1)
 
-    features_csv = sys.argv[1]
-    df = pd.read_csv(features_csv)
-    
     model = load_model()
-    preds, pred_probs = predict_epoch(model, df)
-
-    label_map = {0: 'Normal', 1: 'Pre-apnea Warning', 2: 'Apnea'}
-
-    df['predicted_label'] = preds
-    df['predicted_label_str'] = df['predicted_label'].map(label_map)
-    df['predicted_prob'] = pred_probs.max(axis=1)
-    
-    output_csv = features_csv.replace('.csv', '_predictions.csv')
-    df.to_csv(output_csv, index=False)
-    print(f"Predictions saved to {output_csv}")
+    df = pd.concat([predict_record(model, record) for record in records], ignore_index=True)
 
     # Print summary counts
     counts = df['predicted_label_str'].value_counts()
@@ -0,0 +1,207 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# Off unless APNEA_METRICS=1 (or enable() is called): disabled, timed() hands back a shared no-op
+# context manager and count()/observe() return after one flag check.
+_enabled = os.environ.get('APNEA_METRICS', '').lower() in ('1', 'true', 'yes')
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRIC_HELP = {
+    'apnea_stage_seconds': 'Wall-clock seconds per call of a pipeline stage',
+    'apnea_http_request_seconds': 'API request latency in seconds by route',
+    'apnea_epochs_total': 'Epochs processed by a pipeline stage',
+    'apnea_rows_scored_total': 'Feature rows scored by the model',
+    'apnea_entropy_undefined_total': 'Epochs whose entropy features are undefined (kept as NaN)',
+    'apnea_http_responses_total': 'API responses by route and status code',
+}
+
+_NOOP = contextlib.nullcontext()
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+
+def enabled():
+    return _enabled
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+
+class Metrics:
+    """
+    In-process histograms and counters keyed by metric name and label values.
+    Each process (API worker, pool worker) has its own; snapshots can be merged into another.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, metric, value, labels):
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(value)
+
+    def inc(self, metric, n, labels):
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def snapshot(self, reset=False):
+        with self._lock:
+            snap = {
+                'histograms': [[m, list(l), h.counts, h.count, h.sum, h.max] for (m, l), h in self.histograms.items()],
+                'counters': [[m, list(l), v] for (m, l), v in self.counters.items()]
+            }
+            if reset:
+                self.histograms, self.counters = {}, {}
+        return snap
+
+    def merge(self, snap):
+        """Add a snapshot taken in another process (e.g. a pool worker) to these metrics."""
+        with self._lock:
+            for metric, labels, counts, count, total, peak in snap['histograms']:
+                key = (metric, tuple(tuple(kv) for kv in labels))
+                hist = self.histograms.setdefault(key, Histogram())
+                hist.counts = [a + b for a, b in zip(hist.counts, counts)]
+                hist.count += count
+                hist.sum += total
+                hist.max = max(hist.max, peak)
+            for metric, labels, value in snap['counters']:
+                key = (metric, tuple(tuple(kv) for kv in labels))
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def prometheus_text(self):
+        """Prometheus text exposition format (0.0.4)."""
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}' if pairs else ''
+
+        lines = []
+        with self._lock:
+            by_metric = {}
+            for (metric, labels), hist in sorted(self.histograms.items()):
+                by_metric.setdefault(metric, []).append((labels, hist))
+            for metric, series in by_metric.items():
+                lines.append(f'# HELP {metric} {METRIC_HELP.get(metric, metric)}')
+                lines.append(f'# TYPE {metric} histogram')
+                for labels, hist in series:
+                    cumulative = 0
+                    for bound, n in zip(hist.buckets, hist.counts):
+                        cumulative += n
+                        lines.append(f'{metric}_bucket{fmt(labels, [("le", bound)])} {cumulative}')
+                    lines.append(f'{metric}_bucket{fmt(labels, [("le", "+Inf")])} {hist.count}')
+                    lines.append(f'{metric}_sum{fmt(labels)} {hist.sum}')
+                    lines.append(f'{metric}_count{fmt(labels)} {hist.count}')
+            by_metric = {}
+            for (metric, labels), value in sorted(self.counters.items()):
+                by_metric.setdefault(metric, []).append((labels, value))
+            for metric, series in by_metric.items():
+                lines.append(f'# HELP {metric} {METRIC_HELP.get(metric, metric)}')
+                lines.append(f'# TYPE {metric} counter')
+                for labels, value in series:
+                    lines.append(f'{metric}{fmt(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def report(self):
+        """Per-stage call counts and times plus counters, as plain JSON-able dicts."""
+        with self._lock:
+            timings = [
+                {'metric': metric, **dict(labels), 'calls': h.count, 'total_s': round(h.sum, 6),
+                 'mean_s': round(h.sum / h.count, 6) if h.count else None, 'max_s': round(h.max, 6)}
+                for (metric, labels), h in sorted(self.histograms.items())
+            ]
+            counters = [{'metric': metric, **dict(labels), 'value': value}
+                        for (metric, labels), value in sorted(self.counters.items())]
+        return {'timings': timings, 'counters': counters}
+
+
+metrics = Metrics()
+
+
+class _Timer:
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        metrics.observe('apnea_stage_seconds', time.perf_counter() - self.start, {'stage': self.stage})
+        return False
+
+
+def timed(stage):
+    """Context manager timing one call of a stage (no-op when instrumentation is off)."""
+    if not _enabled:
+        return _NOOP
+    return _Timer(stage)
+
+
+def count(metric, n=1, **labels):
+    if _enabled:
+        metrics.inc(metric, n, labels)
+
+
+def observe(metric, value, **labels):
+    if _enabled:
+        metrics.observe(metric, value, labels)
+
+
+def write_report(path, **extra):
+    """Write the JSON run report of a batch script (nothing is written when instrumentation is off)."""
+    if not _enabled:
+        return None
+    report = {'created': datetime.now(timezone.utc).isoformat(), 'pid': os.getpid(), **extra, **metrics.report()}
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Run report saved to {path}")
+    return path
+
+
+def run_and_collect(fn, *args, **kwargs):
+    """
+    Pool task wrapper: run fn in a worker and return (result, metrics snapshot), the snapshot
+    taken and reset in the worker so the parent can merge() it. The snapshot is None when off.
+    """
+    result = fn(*args, **kwargs)
+    return result, metrics.snapshot(reset=True) if _enabled else None
+
+
+def merge_results(collected):
+    """Unpack run_and_collect results in the parent, merging worker metrics; returns the results."""
+    results = []
+    for result, snap in collected:
+        if snap is not None:
+            metrics.merge(snap)
+        results.append(result)
+    return results
@@ -0,0 +1,225 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+from torch.ao.quantization import quantize_dynamic
+from feature_extraction_multiclass import FEATURE_COLUMNS
+from predictor import LABEL_MAP
+from sequence_dataset import load_sequence_config, prepare_sequences
+from instrumentation import timed, count
+
+LSTM_MODEL_PATH = 'models/lstm_improved_apnea_model.pth'
+# Window lengths of models trained before the window was saved next to the weights
+LEGACY_SEQ_LENGTHS = {'lstm_apnea_model.pth': 5, 'lstm_improved_apnea_model.pth': 10}
+SCORE_BATCH = 4096  # windows per forward pass in score_windows
+MAX_SESSIONS = 10_000  # streaming sessions kept; the least recently stepped are dropped first
+SESSION_TTL_S = 3600  # sessions not stepped for this long are dropped
+
+
+class SequenceScorer(nn.Module):
+    """
+    The LSTMModel of either training script (same lstm/fc parameter names), with the recurrent
+    state as explicit input and output so it can be stepped and exported to TorchScript.
+    forward returns the logits of the last time step and the final (h, c).
+    """
+    def __init__(self, input_dim, hidden_dim, output_dim, num_layers=1, bidirectional=False):
+        super().__init__()
+        self.lstm = nn.LSTM(input_dim, hidden_dim, num_layers, batch_first=True, bidirectional=bidirectional)
+        self.fc = nn.Linear(hidden_dim * (2 if bidirectional else 1), output_dim)
+
+    def forward(self, x, h, c):
+        out, (h, c) = self.lstm(x, (h, c))
+        return self.fc(out[:, -1, :]), h, c
+
+
+def architecture(state_dict):
+    """LSTM dimensions of a training state dict; the .pth files store weights only."""
+    w = state_dict['lstm.weight_ih_l0']
+    layers = {int(k[len('lstm.weight_ih_l'):].split('_')[0]) for k in state_dict if k.startswith('lstm.weight_ih_l')}
+    return {
+        'input_dim': w.shape[1],
+        'hidden_dim': w.shape[0] // 4,
+        'output_dim': state_dict['fc.weight'].shape[0],
+        'num_layers': len(layers),
+        'bidirectional': any(k.endswith('_reverse') for k in state_dict)
+    }
+
+
+class LSTMEngine:
+    """
+    CPU inference for the LSTM models trained by train_lstm_model*.py.
+
+    score_windows()/score_frame() score every full window of one or many records in large
+    batches. step() advances sessions (one per patient) by one epoch each, all in one forward
+    pass. Each session keeps a rolling window of its last seq_length rows, so a streamed epoch
+    gets exactly the score the batch path gives the window ending on it. The model was
+    trained on windows starting from a zero state, so carrying the recurrent state across a
+    whole session would drift from those scores (and a bidirectional model cannot be stepped
+    at all). Sessions have no prediction until their first window is full; at most
+    max_sessions are kept, least recently stepped first out, and idle ones expire after
+    session_ttl_s as measured by clock.
+    """
+    def __init__(self, module, arch, seq_length, feature_names=FEATURE_COLUMNS, threads=None,
+                 max_sessions=MAX_SESSIONS, session_ttl_s=SESSION_TTL_S, clock=time.monotonic):
+        if threads:
+            torch.set_num_threads(threads)
+        self.module = module.eval()
+        self.arch = dict(arch)
+        self.seq_length = seq_length
+        self.feature_names = list(feature_names)
+        self.max_sessions = max_sessions
+        self.session_ttl_s = session_ttl_s
+        self.clock = clock
+        self.sessions = OrderedDict()  # session -> (last step time, rows), least recently stepped first
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._state_shape = (arch['num_layers'] * (2 if arch['bidirectional'] else 1), arch['hidden_dim'])
+
+    @classmethod
+    def load(cls, path=LSTM_MODEL_PATH, seq_length=None, quantize=False, threads=None, **session_options):
+        """
+        Load a training state dict (.pth) or an engine exported with export() (.pt).
+        The window length and feature order come from the config saved with the model (or the
+        export), unless seq_length is given. quantize applies dynamic int8 quantization to the
+        LSTM and linear weights. session_options: max_sessions, session_ttl_s, clock.
+        """
+        if path.endswith('.pt'):
+            extra = {'engine.json': ''}
+            module = torch.jit.load(path, map_location='cpu', _extra_files=extra)
+            meta = json.loads(extra['engine.json'])
+            print(f"Loaded TorchScript LSTM from {path}")
+            return cls(module, meta['arch'], seq_length or meta['seq_length'], meta['features'], threads,
+                       **session_options)
+
+        config = load_sequence_config(path) or {}
+        seq_length = seq_length or config.get('seq_length') or LEGACY_SEQ_LENGTHS.get(os.path.basename(path))
+        if seq_length is None:
+            raise ValueError(f"No window length saved for {path}; pass seq_length")
+        state_dict = torch.load(path, map_location='cpu')
+        arch = architecture(state_dict)
+        module = SequenceScorer(**arch)
+        module.load_state_dict(state_dict)
+        if quantize:
+            module = quantize_dynamic(module.eval(), {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+        print(f"Loaded LSTM from {path} (windows of {seq_length} epochs)")
+        return cls(module, arch, seq_length, config.get('features', FEATURE_COLUMNS), threads, **session_options)
+
+    def export(self, path, quantize=True):
+        """Save as TorchScript (dynamically quantized unless quantize=False); load() reads it back."""
+        module = self.module
+        if quantize and not isinstance(module, torch.jit.ScriptModule):
+            module = quantize_dynamic(module, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+        scripted = module if isinstance(module, torch.jit.ScriptModule) else torch.jit.script(module)
+        meta = {'arch': self.arch, 'seq_length': self.seq_length, 'features': self.feature_names}
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        torch.jit.save(scripted, path, _extra_files={'engine.json': json.dumps(meta)})
+        print(f"TorchScript LSTM saved to {path}")
+        return path
+
+    def _forward(self, x):
+        # Every window starts from a zero state, as in training
+        layers, hidden = self._state_shape
+        h, c = torch.zeros(layers, x.shape[0], hidden), torch.zeros(layers, x.shape[0], hidden)
+        count('apnea_rows_scored_total', x.shape[0], model='lstm')
+        with timed('lstm.score'), torch.no_grad():
+            logits, _, _ = self.module(x, h, c)
+            return torch.softmax(logits, dim=1)
+
+    def score_windows(self, data, starts=None, batch_size=SCORE_BATCH):
+        """
+        Class probabilities of the windows starting at `starts` rows of a (n_rows, n_features)
+        matrix (default: every full window). Windows are gathered one batch at a time.
+        """
+        data = np.ascontiguousarray(data, dtype=np.float32)
+        if starts is None:
+            starts = np.arange(max(len(data) - self.seq_length + 1, 0))
+        starts = np.asarray(starts, dtype=np.int64)
+        offsets = np.arange(self.seq_length)
+        proba = np.empty((len(starts), self.arch['output_dim']), dtype=np.float32)
+        for i in range(0, len(starts), batch_size):
+            windows = data[starts[i:i + batch_size, np.newaxis] + offsets]
+            proba[i:i + batch_size] = self._forward(torch.from_numpy(windows)).numpy()
+        return proba
+
+    def score_frame(self, features_df, batch_size=SCORE_BATCH):
+        """
+        Predictions for a features frame with epoch (and optionally record) columns; windows of
+        all records share batches. One row per full window, at the epoch the window ends on.
+        """
+        df = features_df.assign(record='') if 'record' not in features_df else features_df
+        df = df.sort_values(['record', 'epoch'], kind='stable')
+        data, starts, _ = prepare_sequences(df[['record', 'epoch'] + self.feature_names], self.seq_length)
+        proba = self.score_windows(data, starts, batch_size)
+        ends = starts + self.seq_length - 1
+        labels = proba.argmax(axis=1)
+        out = pd.DataFrame({
+            'record': df['record'].to_numpy()[ends],
+            'epoch': df['epoch'].to_numpy()[ends],
+            'predicted_label': labels,
+            'predicted_label_str': pd.Series(labels).map(LABEL_MAP).to_numpy(),
+            'predicted_prob': proba.max(axis=1)
+        })
+        return out if 'record' in features_df else out.drop(columns=['record'])
+
+    def step(self, sessions, rows):
+        """
+        Score one new epoch per session. rows is (len(sessions), n_features) in feature_names
+        order; sessions must be distinct. Returns (len(sessions), n_classes) probabilities,
+        NaN for sessions whose first window is not full yet.
+        """
+        if len(set(sessions)) != len(sessions):
+            raise ValueError("Each session can only advance by one epoch per step")
+        rows = np.ascontiguousarray(rows, dtype=np.float32).reshape(len(sessions), -1)
+        proba = np.full((len(sessions), self.arch['output_dim']), np.nan, dtype=np.float32)
+        now = self.clock()
+        full = []
+        with self._lock:
+            for i, session in enumerate(sessions):
+                _, window = self.sessions.pop(session, (None, None))
+                if window is None:
+                    window = deque(maxlen=self.seq_length)
+                window.append(rows[i])
+                self.sessions[session] = (now, window)
+                if len(window) == self.seq_length:
+                    full.append(i)
+            windows = np.stack([np.stack(self.sessions[sessions[i]][1]) for i in full]) if full else None
+            self._evict(now)
+        if full:
+            proba[full] = self._forward(torch.from_numpy(windows)).numpy()
+        return proba
+
+    def _evict(self, now):
+        # Sessions are ordered by last step, so the ones to drop are always at the front
+        while self.sessions:
+            seen, _ = next(iter(self.sessions.values()))
+            expired = self.session_ttl_s is not None and now - seen > self.session_ttl_s
+            if len(self.sessions) <= self.max_sessions and not expired:
+                break
+            self.sessions.popitem(last=False)
+            self.evictions += 1
+
+    def reset(self, session=None):
+        """Forget one session's rows (or every session's)."""
+        with self._lock:
+            if session is None:
+                self.sessions.clear()
+            else:
+                self.sessions.pop(session, None)
+
+
+if __name__ == "__main__":
+    # Usage: python src/lstm_inference.py [model.pth] [export.pt]
+    # Loads the LSTM, scores the features_multiclass table and optionally exports a quantized TorchScript engine.
+    from feature_store import read_table
+    args = sys.argv[1:]
+    engine = LSTMEngine.load(args[0] if args else LSTM_MODEL_PATH)
+    predictions = engine.score_frame(read_table('features_multiclass'))
+    print(predictions.groupby(['record', 'predicted_label_str']).size().unstack(fill_value=0))
+    if len(args) > 1:
+        engine.export(args[1])
@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+import joblib
+from predictor import Predictor, load_feature_schema
+
+REGISTRY_DIR = 'models/registry'
+MANIFEST_FILE = 'manifest.json'
+CURRENT_FILE = 'CURRENT'
+
+
+def _write_atomic(path, text):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def model_dir(name, registry_dir=REGISTRY_DIR):
+    return os.path.join(registry_dir, name)
+
+
+def current_version(name, registry_dir=REGISTRY_DIR):
+    path = os.path.join(model_dir(name, registry_dir), CURRENT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read().strip() or None
+
+
+def legacy_version(path):
+    # A fallback pickle has no registry version: its size and mtime change when it is retrained
+    if not os.path.exists(path):
+        return f'legacy:{os.path.basename(path)}'
+    st = os.stat(path)
+    return f'legacy:{os.path.basename(path)}:{st.st_size:x}-{st.st_mtime_ns:x}'
+
+
+def publish_model(model, name, feature_names, registry_dir=REGISTRY_DIR, version=None, activate=True):
+    """
+    Save a versioned model artifact with its feature-schema manifest.
+
+    XGBoost models are stored in the native UBJSON format (fast to load, no pickle);
+    anything else falls back to joblib. With activate=True the new version becomes CURRENT,
+    which running services pick up on their next refresh.
+    Returns the version string.
+    """
+    version = version or datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+    version_dir = os.path.join(model_dir(name, registry_dir), version)
+    os.makedirs(version_dir, exist_ok=True)
+
+    if hasattr(model, 'get_booster') or hasattr(model, 'inplace_predict'):
+        artifact, fmt = 'model.ubj', 'xgboost-ubj'
+        model.save_model(os.path.join(version_dir, artifact))
+    else:
+        artifact, fmt = 'model.pkl', 'joblib'
+        joblib.dump(model, os.path.join(version_dir, artifact))
+
+    classes = getattr(model, 'classes_', None)
+    manifest = {
+        'name': name,
+        'version': version,
+        'format': fmt,
+        'artifact': artifact,
+        'features': [str(f) for f in feature_names],
+        'classes': [int(c) for c in classes] if classes is not None else None,
+        'created': datetime.now(timezone.utc).isoformat()
+    }
+    _write_atomic(os.path.join(version_dir, MANIFEST_FILE), json.dumps(manifest, indent=2))
+    if activate:
+        _write_atomic(os.path.join(model_dir(name, registry_dir), CURRENT_FILE), version)
+    print(f"Published {name} version {version} ({fmt})")
+    return version
+
+
+def load_version(name, version, registry_dir=REGISTRY_DIR):
+    version_dir = os.path.join(model_dir(name, registry_dir), version)
+    with open(os.path.join(version_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    artifact_path = os.path.join(version_dir, manifest['artifact'])
+    if manifest['format'] == 'xgboost-ubj':
+        import xgboost as xgb
+        model = xgb.Booster()
+        model.load_model(artifact_path)
+    else:
+        model = joblib.load(artifact_path)
+    return Predictor(model, manifest['features'], manifest['classes']), manifest
+
+
+class ModelRegistry:
+    """
+    Serves the CURRENT version of a registered model to a long-running process.
+
+    Nothing is loaded at import time: the model is loaded on the first get() (or an explicit
+    load() from a startup hook). get() re-checks the CURRENT pointer at most every
+    check_interval_s seconds and swaps in a newly published version without a restart.
+    When the registry has no entry yet, fallback_path (a legacy joblib pickle) is used.
+    """
+    def __init__(self, name, registry_dir=REGISTRY_DIR, fallback_path=None, check_interval_s=5.0):
+        self.name = name
+        self.registry_dir = registry_dir
+        self.fallback_path = fallback_path
+        self.check_interval_s = check_interval_s
+        self.predictor = None
+        self.version = None
+        self.metrics = {'loads': 0}
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._created = time.perf_counter()
+
+    def _load(self, version):
+        start = time.perf_counter()
+        if version is not None:
+            predictor, _ = load_version(self.name, version, self.registry_dir)
+        elif self.fallback_path is not None and os.path.exists(self.fallback_path):
+            version = legacy_version(self.fallback_path)
+            model = joblib.load(self.fallback_path)
+            predictor = Predictor(model, load_feature_schema(self.fallback_path, model))
+        else:
+            raise FileNotFoundError(f"No registered version of {self.name} and no fallback model")
+        load_s = time.perf_counter() - start
+
+        self.predictor, self.version = predictor, version
+        self.metrics['loads'] += 1
+        self.metrics['last_load_s'] = round(load_s, 6)
+        self.metrics['loaded_at'] = datetime.now(timezone.utc).isoformat()
+        if 'first_load_s' not in self.metrics:
+            self.metrics['first_load_s'] = round(load_s, 6)
+            self.metrics['ready_after_s'] = round(time.perf_counter() - self._created, 6)
+        print(f"Loaded {self.name} version {version} in {load_s:.3f}s")
+
+    def load(self):
+        """Load (or reload) whatever version is CURRENT right now."""
+        with self._lock:
+            self._last_check = time.monotonic()
+            self._load(current_version(self.name, self.registry_dir))
+            return self.predictor
+
+    def get(self):
+        """
+        The served predictor. If a newly published version fails to load, the loaded one keeps
+        serving and the load is retried at the next check; only without any model is it raised.
+        """
+        now = time.monotonic()
+        if self.predictor is not None and now - self._last_check < self.check_interval_s:
+            return self.predictor
+        with self._lock:
+            self._last_check = now
+            try:
+                version = current_version(self.name, self.registry_dir)
+                if self.predictor is None or (version is not None and version != self.version):
+                    self._load(version)
+            except Exception as e:
+                if self.predictor is None:
+                    raise
+                self.metrics['load_errors'] = self.metrics.get('load_errors', 0) + 1
+                error = f'{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ""}'
+                self.metrics['last_error'] = error
+                print(f"Could not load {self.name}, still serving version {self.version}: {error}")
+            return self.predictor
+
+    def status(self):
+        return {'name': self.name, 'version': self.version, **self.metrics}
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 3:
+        print("Usage: python src/model_registry.py <model_pkl> <name>")
+        exit(1)
+
+    # Convert an existing joblib model into a registry version
+    model_path, name = sys.argv[1], sys.argv[2]
+    model = joblib.load(model_path)
+    publish_model(model, name, load_feature_schema(model_path, model))
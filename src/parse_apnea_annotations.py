@@ -28,7 +28,7 @@ def parse_apnea_annotations(record_name, raw_data_path='data/raw/'):
             end_sec = start_sec + 30  
             events.append({'start_sec': start_sec, 'end_sec': end_sec})
 
-    df_apnea = pd.DataFrame(events)
+    df_apnea = pd.DataFrame(events, columns=['start_sec', 'end_sec'])
     csv_path = f'data/apnea_annotations_{record_name}.csv'
     df_apnea.to_csv(csv_path, index=False)
     print(f"Apnea annotation CSV saved to {csv_path}")
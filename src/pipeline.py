@@ -0,0 +1,243 @@
+import glob
+import hashlib
+import importlib.util
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from functools import partial
+import numpy as np
+from epoch_store import epochs_path
+from feature_store import FEATURE_STORE_DIR, partition_path
+from instrumentation import write_report, run_and_collect, merge_results
+
+RAW_DIR = 'data/raw/'
+EPOCHS_DIR = 'data/processed_15s_epochs'
+MODEL_PATH = 'models/xgboost_balanced_model.pkl'
+PIPELINE_DIR = 'data/pipeline'  # stage stamps and timing reports
+
+
+# Stage functions: one record (or, for global stages, the list of records) in, declared outputs written.
+# Stage modules are imported when the stage runs, so skipped stages cost no imports (wfdb, xgboost).
+
+def stage_ecg(record):
+    from save_test_record_ecg import save_record_ecg
+    save_record_ecg(record, RAW_DIR, f'data/new_patient_ecg_{record}.npy')
+
+
+def stage_epochs(record):
+    from segment_15s_epochs import segment_and_save_15s_epochs
+    segment_and_save_15s_epochs(np.load(f'data/new_patient_ecg_{record}.npy'), output_dir=EPOCHS_DIR, record=record)
+
+
+def stage_annotations(record):
+    from parse_apnea_annotations import parse_apnea_annotations
+    parse_apnea_annotations(record, RAW_DIR)
+
+
+def stage_labels(record):
+    from create_pre_apnea_labels import save_record_labels
+    save_record_labels(record, EPOCHS_DIR, f'data/apnea_annotations_{record}.csv')
+
+
+def stage_features(record):
+    from advanced_feature_extraction import extract_features_for_all_epochs
+    from feature_cache import FeatureCache
+    extract_features_for_all_epochs(EPOCHS_DIR, record, FEATURE_STORE_DIR, cache=FeatureCache())
+
+
+def stage_train(records):
+    from train_xgboost_balanced import train_xgboost_balanced
+    train_xgboost_balanced(records, MODEL_PATH)
+
+
+def stage_predictions(record):
+    from inference_xgboost_balanced import load_model, predict_record
+    predict_record(load_model(MODEL_PATH), record)
+
+
+def stage_events(record):
+    from xgboost_alert_consolidation import consolidate_predictions
+    consolidate_predictions(record)
+
+
+class Stage:
+    """
+    A pipeline step with declared input and output paths ('{record}' is filled in per record).
+    `module` is the src module doing the work and `helpers` the src modules it calls; their
+    source counts as an input, so editing any of them reruns the stage. Global stages (per_record=False) run once over all records; their
+    '{record}' inputs expand to every record.
+    """
+    def __init__(self, name, fn, module, inputs, outputs, per_record=True, helpers=()):
+        self.name = name
+        self.fn = fn
+        self.module = module
+        self.helpers = list(helpers)
+        self.inputs = inputs
+        self.outputs = outputs
+        self.per_record = per_record
+
+    def expand(self, templates, record, records):
+        if self.per_record:
+            return [t.format(record=record) for t in templates]
+        return sorted({t.format(record=r) for t in templates for r in records})
+
+
+def build_stages(train=False):
+    features = partition_path('features', '{record}')
+    stages = [
+        Stage('ecg', stage_ecg, 'save_test_record_ecg', [RAW_DIR + '{record}.hea', RAW_DIR + '{record}.dat'],
+              ['data/new_patient_ecg_{record}.npy']),
+        Stage('epochs', stage_epochs, 'segment_15s_epochs', ['data/new_patient_ecg_{record}.npy'], [epochs_path(EPOCHS_DIR, '{record}')],
+              helpers=['epoch_store']),
+        Stage('annotations', stage_annotations, 'parse_apnea_annotations', [RAW_DIR + '{record}.apn'], ['data/apnea_annotations_{record}.csv']),
+        Stage('labels', stage_labels, 'create_pre_apnea_labels',
+              ['data/apnea_annotations_{record}.csv', epochs_path(EPOCHS_DIR, '{record}')],
+              [partition_path('labels', '{record}')], helpers=['epoch_store', 'epoch_labeling', 'feature_store']),
+        Stage('features', stage_features, 'advanced_feature_extraction', [epochs_path(EPOCHS_DIR, '{record}')], [features],
+              helpers=['fast_entropy', 'epoch_store', 'feature_cache', 'feature_store']),
+    ]
+    if train:
+        stages.append(Stage('train', stage_train, 'train_xgboost_balanced', [features, partition_path('labels', '{record}')], [MODEL_PATH],
+                            per_record=False, helpers=['cross_validation', 'predictor', 'model_registry', 'feature_store']))
+    stages += [
+        Stage('predictions', stage_predictions, 'inference_xgboost_balanced', [features, MODEL_PATH],
+              [partition_path('predictions', '{record}')], helpers=['predictor', 'feature_store']),
+        Stage('events', stage_events, 'xgboost_alert_consolidation', [partition_path('predictions', '{record}')],
+              [partition_path('events', '{record}')], helpers=['event_consolidation', 'feature_store']),
+    ]
+    return stages
+
+
+def check_dag(stages):
+    """Every input must be produced by an earlier stage or already exist (raw data, a trained model)."""
+    produced = set()
+    for stage in stages:
+        for template in stage.inputs:
+            if template not in produced and '{record}' not in template and not os.path.exists(template):
+                raise FileNotFoundError(f"Stage {stage.name} needs {template}, which no earlier stage produces")
+        produced.update(stage.outputs)
+
+
+def _signature(stage, inputs):
+    # Input files plus the code of the stage and its helpers; unchanged signature and existing outputs mean skip
+    h = hashlib.sha256()
+    for path in inputs + [importlib.util.find_spec(m).origin for m in [stage.module] + stage.helpers]:
+        st = os.stat(path)
+        h.update(f'{path}:{st.st_size}:{st.st_mtime_ns};'.encode())
+    return h.hexdigest()
+
+
+def _stamp_path(stage, record):
+    return os.path.join(PIPELINE_DIR, 'stamps', f'{stage.name}-{record or "all"}.json')
+
+
+def run_stage(stage, record=None, records=None, force=False):
+    """Run one stage for one record (or all records) unless it is up to date. Returns a timing row."""
+    inputs = stage.expand(stage.inputs, record, records)
+    outputs = stage.expand(stage.outputs, record, records)
+    start = time.perf_counter()
+    row = {'stage': stage.name, 'record': record or 'all'}
+    missing = [p for p in inputs if not os.path.exists(p)]
+    if missing:
+        return {**row, 'status': 'missing inputs', 'seconds': 0.0, 'detail': missing}
+
+    stamp_path = _stamp_path(stage, record)
+    signature = _signature(stage, inputs)
+    if not force and all(os.path.exists(p) for p in outputs) and os.path.exists(stamp_path):
+        with open(stamp_path) as f:
+            if json.load(f).get('signature') == signature:
+                return {**row, 'status': 'skipped', 'seconds': round(time.perf_counter() - start, 4)}
+
+    try:
+        stage.fn(record if stage.per_record else records)
+    except Exception as e:
+        return {**row, 'status': 'failed', 'seconds': round(time.perf_counter() - start, 4), 'detail': str(e)}
+    os.makedirs(os.path.dirname(stamp_path), exist_ok=True)
+    with open(stamp_path, 'w') as f:
+        json.dump({'signature': signature, 'inputs': inputs, 'outputs': outputs}, f, indent=2)
+    return {**row, 'status': 'ran', 'seconds': round(time.perf_counter() - start, 4)}
+
+
+def run_record_stages(record, stage_names, train=False, force=False):
+    # Runs in a worker: this record's consecutive per-record stages, stopping at the first that cannot complete
+    stages = {s.name: s for s in build_stages(train)}
+    timings = []
+    for name in stage_names:
+        timings.append(run_stage(stages[name], record, force=force))
+        if timings[-1]['status'] in ('failed', 'missing inputs'):
+            break
+    return timings
+
+
+def run_pipeline(records, workers=None, train=False, force=False, report_path=None):
+    """
+    Run the DAG for the given records. Consecutive per-record stages run as one task per record
+    on a process pool; global stages (training) run in this process between them. Stages whose
+    inputs and code are unchanged since their last run are skipped. Per-stage timings are written
+    to data/pipeline/timings.json (or report_path) and returned.
+    """
+    stages = build_stages(train)
+    check_dag(stages)
+    workers = min(workers or mp.cpu_count(), max(len(records), 1))
+
+    # Group the topologically ordered stages into waves of per-record stages and single global stages
+    waves = []
+    for stage in stages:
+        if stage.per_record and waves and waves[-1][0]:
+            waves[-1][1].append(stage.name)
+        else:
+            waves.append((stage.per_record, [stage.name]))
+
+    timings = []
+    active = list(records)
+    start = time.perf_counter()
+    for per_record, names in waves:
+        if per_record:
+            task = partial(run_and_collect, run_record_stages, stage_names=names, train=train, force=force)
+            if workers == 1:
+                results = merge_results(task(record) for record in active)
+            else:
+                with mp.Pool(workers) as pool:
+                    results = merge_results(pool.map(task, active))
+            for record_timings in results:
+                timings.extend(record_timings)
+            # Records that could not complete a stage are left out of the later waves
+            stopped = {t['record'] for r in results for t in r if t['status'] in ('failed', 'missing inputs')}
+            active = [r for r in active if r not in stopped]
+        else:
+            stage = next(s for s in stages if s.name == names[0])
+            timings.append(run_stage(stage, records=active, force=force))
+            if timings[-1]['status'] in ('failed', 'missing inputs'):
+                break
+
+    report = {'records': list(records), 'workers': workers, 'seconds': round(time.perf_counter() - start, 3),
+              'stages': timings}
+    report_path = report_path or os.path.join(PIPELINE_DIR, 'timings.json')
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for t in timings:
+        detail = f"  ({t['detail']})" if 'detail' in t else ''
+        print(f"{t['stage']:<12} {t['record']:<6} {t['status']:<15} {t['seconds']:>8.3f}s{detail}")
+    print(f"Pipeline finished in {report['seconds']:.1f}s; timings saved to {report_path}")
+    write_report(os.path.join(PIPELINE_DIR, 'run_report.json'), records=len(records), workers=workers)
+    return report
+
+
+if __name__ == "__main__":
+    # Usage: python src/pipeline.py [--workers N] [--train] [--force] [record ...]
+    # Without records, every record with a header in data/raw is processed.
+    args = sys.argv[1:]
+    workers = None
+    if '--workers' in args:
+        i = args.index('--workers')
+        workers = int(args[i + 1])
+        del args[i:i + 2]
+    flags = {a for a in args if a.startswith('--')}
+    records = [a for a in args if not a.startswith('--')]
+    if not records:
+        records = sorted(os.path.basename(p)[:-4] for p in glob.glob(os.path.join(RAW_DIR, '*.hea')))
+    run_pipeline(records, workers=workers, train='--train' in flags, force='--force' in flags)
@@ -0,0 +1,93 @@
+import json
+import os
+import warnings
+import joblib
+import numpy as np
+import pandas as pd
+from instrumentation import timed, count
+
+LABEL_MAP = {0: 'Normal', 1: 'Pre-apnea Warning', 2: 'Apnea'}
+
+
+def schema_path(model_path):
+    return os.path.splitext(model_path)[0] + '.features.json'
+
+
+def save_feature_schema(model_path, feature_names):
+    """Store the training feature order next to the model artifact."""
+    with open(schema_path(model_path), 'w') as f:
+        json.dump({'features': list(feature_names)}, f, indent=2)
+
+
+def load_feature_schema(model_path, model=None):
+    path = schema_path(model_path)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)['features']
+    # Older artifacts have no schema file; sklearn-style models remember their training columns
+    names = getattr(model, 'feature_names_in_', None)
+    return [str(n) for n in names] if names is not None else None
+
+
+class Predictor:
+    """
+    A model loaded once, scoring contiguous float32 feature matrices.
+
+    predict() returns labels and class probabilities from a single pass: XGBoost models go
+    through the booster's inplace_predict (no DMatrix, no DataFrame), other classifiers through
+    one predict_proba call, with the label taken as the most probable class.
+    """
+    def __init__(self, model, feature_names=None, classes=None):
+        self.model = model
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.classes = np.asarray(classes if classes is not None else getattr(model, 'classes_', []))
+        if hasattr(model, 'inplace_predict'):  # a bare xgboost Booster
+            self._booster = model
+        else:
+            self._booster = model.get_booster() if hasattr(model, 'get_booster') else None
+
+    @classmethod
+    def load(cls, path):
+        model = joblib.load(path)
+        print(f"Loaded model from {path}")
+        return cls(model, load_feature_schema(path, model))
+
+    def to_matrix(self, X):
+        """Validate features against the schema and return a C-contiguous float32 matrix."""
+        if isinstance(X, pd.DataFrame):
+            if self.feature_names is not None:
+                missing = [f for f in self.feature_names if f not in X.columns]
+                if missing:
+                    raise ValueError(f"Missing features: {missing}")
+                X = X[self.feature_names]
+            X = X.to_numpy()
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        if self.feature_names is not None and X.shape[1] != len(self.feature_names):
+            raise ValueError(f"Expected {len(self.feature_names)} features, got {X.shape[1]}")
+        return X
+
+    def predict_proba(self, X):
+        X = self.to_matrix(X)
+        count('apnea_rows_scored_total', len(X))
+        with timed('model.score'):
+            return self._predict_proba(X)
+
+    def _predict_proba(self, X):
+        if self._booster is not None:
+            proba = self._booster.inplace_predict(X)
+            if proba.ndim == 1:  # binary:logistic returns P(class 1) only
+                proba = np.column_stack([1 - proba, proba])
+            return proba
+        with warnings.catch_warnings():
+            # Models fitted on DataFrames warn about unnamed input; the schema check above covers it
+            warnings.filterwarnings('ignore', message='X does not have valid feature names')
+            return self.model.predict_proba(X)
+
+    def predict(self, X):
+        """Return (labels, probabilities) with one model pass."""
+        proba = self.predict_proba(X)
+        idx = proba.argmax(axis=1)
+        labels = self.classes[idx] if len(self.classes) else idx
+        return labels, proba
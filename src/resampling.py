@@ -0,0 +1,89 @@
+from fractions import Fraction
+from functools import lru_cache
+import numpy as np
+from scipy.signal import firwin, resample, resample_poly
+
+
+@lru_cache(maxsize=None)
+def resample_ratio(fs, target_fs):
+    """Reduced (up, down) factors taking fs to target_fs."""
+    ratio = Fraction(target_fs).limit_denominator(10000) / Fraction(fs).limit_denominator(10000)
+    return ratio.numerator, ratio.denominator
+
+
+@lru_cache(maxsize=None)
+def resample_kernel(up, down):
+    # Same anti-aliasing FIR resample_poly designs by default (Kaiser, beta=5), built once per ratio
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    return firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', 5.0))
+
+
+def _context(up, down):
+    # Input samples of context that cover the FIR support, rounded up to a multiple of down
+    half_len = (len(resample_kernel(up, down)) - 1) // 2
+    needed = half_len // up + 2
+    return -(-needed // down) * down
+
+
+def resample_signal(signal, fs, target_fs, block_size=None):
+    """
+    Polyphase resampling of `signal` (along axis 0) from fs to target_fs.
+
+    With block_size (in input samples), the signal is processed in blocks with enough context on
+    both sides to cover the FIR filter, so interior samples equal whole-signal resample_poly and
+    only one block is in memory at a time. Output length is int(n * target_fs / fs), as before.
+    """
+    if fs == target_fs:
+        return signal
+    up, down = resample_ratio(fs, target_fs)
+    kernel = resample_kernel(up, down)
+    n_in = signal.shape[0]
+    n_out = int(n_in * target_fs / fs)
+
+    if block_size is None or block_size >= n_in:
+        return resample_poly(signal, up, down, axis=0, window=kernel)[:n_out]
+
+    block_size = max(down, block_size - block_size % down)  # keep block starts on output samples
+    context = _context(up, down)
+    out = np.empty((n_out,) + signal.shape[1:], dtype=np.float64)
+    for start in range(0, n_in, block_size):
+        stop = min(start + block_size, n_in)
+        lo = max(start - context, 0)
+        hi = min(stop + context, n_in)
+        block = resample_poly(np.asarray(signal[lo:hi], dtype=np.float64), up, down, axis=0, window=kernel)
+        out_start = start * up // down
+        out_stop = min(-(-stop * up // down), n_out)
+        skip = out_start - lo * up // down
+        out[out_start:out_stop] = block[skip:skip + out_stop - out_start]
+    return out
+
+
+def check_resampling_accuracy(fs=128, target_fs=100, seconds=300, seed=0):
+    """
+    Compare the polyphase path with the FFT-based scipy.signal.resample it replaces,
+    on a band-limited synthetic ECG-like signal. Returns the relative RMS difference
+    (edges excluded, where the FFT method wraps around) and checks block-wise == whole-signal.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * fs)) / fs
+    # Beat-like harmonics up to 36 Hz (the band kept by the 0.5-40 Hz filter) plus breathing drift
+    harmonics = np.arange(1, 31)
+    phases = rng.uniform(0, 2 * np.pi, len(harmonics))
+    signal = (np.cos(2 * np.pi * 1.2 * np.outer(t, harmonics) + phases) / harmonics).sum(axis=1)
+    signal += 0.3 * np.sin(2 * np.pi * 0.25 * t)
+
+    fft_out = resample(signal, int(len(signal) * target_fs / fs))
+    poly_out = resample_signal(signal, fs, target_fs)
+    blocks_out = resample_signal(signal, fs, target_fs, block_size=60 * fs)
+
+    edge = 5 * target_fs
+    diff = poly_out[edge:-edge] - fft_out[edge:-edge]
+    rel_rms = np.sqrt(np.mean(diff ** 2)) / np.sqrt(np.mean(fft_out[edge:-edge] ** 2))
+    np.testing.assert_allclose(blocks_out, poly_out, rtol=0, atol=1e-12)
+    print(f"{fs} Hz -> {target_fs} Hz: relative RMS vs FFT resample = {rel_rms:.2e}, block-wise matches whole-signal")
+    return rel_rms
+
+
+if __name__ == "__main__":
+    assert check_resampling_accuracy() < 1e-2
@@ -1,11 +1,16 @@
 import wfdb
 import numpy as np
 
-# Choose a test set record, for example 'x01'
-record_name = 'x01'
-record = wfdb.rdrecord(f'data/raw/{record_name}')  # Adjust path as needed
-ecg_signal = record.p_signal[:, 0]  # First channel ECG
+def save_record_ecg(record_name, raw_data_path='data/raw/', output_path=None):
+    record = wfdb.rdrecord(raw_data_path + record_name)
+    ecg_signal = record.p_signal[:, 0]  # First channel ECG
 
-# Save as .npy for new patient inference simulation
-np.save(f'data/new_patient_ecg_{record_name}.npy', ecg_signal)
-print(f'Saved {record_name} ECG signal as .npy')
+    # Save as .npy for new patient inference simulation
+    output_path = output_path or f'data/new_patient_ecg_{record_name}.npy'
+    np.save(output_path, ecg_signal)
+    print(f'Saved {record_name} ECG signal as .npy')
+    return output_path
+
+if __name__ == "__main__":
+    # Choose a test set record, for example 'x01'
+    save_record_ecg('x01')
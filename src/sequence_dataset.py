@@ -0,0 +1,86 @@
+import json
+import os
+import numpy as np
+import torch
+from torch.utils.data import Dataset, DataLoader, BatchSampler, RandomSampler, SequentialSampler
+
+NON_FEATURE_COLUMNS = ['record', 'epoch', 'label']
+
+
+def sequence_config_path(model_path):
+    return os.path.splitext(model_path)[0] + '.sequence.json'
+
+
+def save_sequence_config(model_path, seq_length, feature_names):
+    """Store the window length and feature order a sequence model was trained with next to its weights."""
+    with open(sequence_config_path(model_path), 'w') as f:
+        json.dump({'seq_length': int(seq_length), 'features': list(feature_names)}, f, indent=2)
+
+
+def load_sequence_config(model_path):
+    path = sequence_config_path(model_path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def prepare_sequences(features_df, seq_length=10):
+    """
+    Overlapping windows of seq_length consecutive epochs, without building them.
+
+    Rows are ordered by record and epoch and windows never span two records. The window
+    starting at row i covers rows i .. i + seq_length - 1 and takes the label of its last epoch.
+    Returns:
+      - data: (n_rows, n_features) float32 feature matrix, each row stored once
+      - starts: (n_windows,) first row of every window
+      - labels: (n_windows,) label of every window (None without a label column)
+    """
+    if 'record' not in features_df:
+        features_df = features_df.assign(record='')
+    df = features_df.sort_values(['record', 'epoch'], kind='stable')
+    data = df.drop(columns=[c for c in NON_FEATURE_COLUMNS if c in df]).to_numpy(dtype=np.float32)
+
+    sizes = df.groupby('record', sort=False).size().to_numpy()
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    # The empty array keeps a frame without rows valid: no windows
+    starts = np.concatenate([np.zeros(0, dtype=np.int64)] +
+                            [offset + np.arange(max(size - seq_length + 1, 0))
+                             for offset, size in zip(offsets, sizes)]).astype(np.int64)
+    labels = df['label'].to_numpy()[starts + seq_length - 1] if 'label' in df else None
+    return data, starts, labels
+
+
+class EpocSeqDataset(Dataset):
+    """
+    Windows over one shared float32 feature tensor. Indexed with a list of window indices it
+    returns the whole batch, gathered with a single indexing op, so no per-window tensors are
+    created and no collate step is needed (see sequence_loader).
+    """
+    def __init__(self, data, starts, labels, seq_length):
+        self.data = torch.from_numpy(np.ascontiguousarray(data, dtype=np.float32))
+        self.starts = torch.from_numpy(np.asarray(starts, dtype=np.int64))
+        self.labels = torch.from_numpy(np.asarray(labels, dtype=np.int64))
+        self.offsets = torch.arange(seq_length)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, idx):
+        idx = torch.as_tensor(idx)
+        rows = self.starts[idx].unsqueeze(-1) + self.offsets
+        return {
+            'input': self.data[rows],
+            'label': self.labels[idx]
+        }
+
+
+def sequence_loader(dataset, batch_size=32, shuffle=False, num_workers=0):
+    """
+    DataLoader handing whole batches of window indices to the dataset (batch_size=None turns
+    off per-item collation). Workers receive the feature tensor once when they start and are
+    kept across training epochs.
+    """
+    sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+    return DataLoader(dataset, sampler=BatchSampler(sampler, batch_size, drop_last=False), batch_size=None,
+                      num_workers=num_workers, persistent_workers=num_workers > 0)
@@ -0,0 +1,156 @@
+import csv
+import os
+import socket
+import time
+from collections import deque
+import numpy as np
+from advanced_feature_extraction import FEATURE_COLUMNS, extract_features_batch
+from inference_xgboost_balanced import load_model
+from event_consolidation import EventConsolidator
+
+LABEL_MAP = {0: 'Normal', 1: 'Pre-apnea Warning', 2: 'Apnea'}
+ALERT_LABELS = [1, 2]
+
+
+class EpochRingBuffer:
+    """
+    Fixed-size sample buffer that turns arbitrarily sized chunks into complete epochs.
+    Memory is bounded by one epoch regardless of how long the stream runs.
+    """
+    def __init__(self, epoch_length):
+        self.epoch_length = epoch_length
+        self._buffer = np.empty(epoch_length, dtype=np.float64)
+        self._fill = 0
+
+    def push(self, chunk):
+        """Add samples; returns the list of epochs completed by this chunk."""
+        chunk = np.asarray(chunk, dtype=np.float64).ravel()
+        completed = []
+        pos = 0
+        while pos < len(chunk):
+            take = min(self.epoch_length - self._fill, len(chunk) - pos)
+            self._buffer[self._fill:self._fill + take] = chunk[pos:pos + take]
+            self._fill += take
+            pos += take
+            if self._fill == self.epoch_length:
+                completed.append(self._buffer.copy())
+                self._fill = 0
+        return completed
+
+
+class StreamingApneaMonitor:
+    """
+    Scores 15 s epochs as soon as they are complete and keeps consolidated apnea events up to date.
+
+    Each completed epoch goes through the 12 advanced features and one XGBoost predict_proba call.
+    Alert epochs (Pre-apnea Warning / Apnea) separated by at most max_gap epochs belong to the same event.
+    Only the last `history` epoch results are kept in memory.
+    """
+    def __init__(self, model, fs=100, epoch_duration=15, max_gap=1, latency_budget_s=1.0, history=240):
+        self.model = model
+        self.fs = fs
+        self.buffer = EpochRingBuffer(fs * epoch_duration)
+        self.latency_budget_s = latency_budget_s
+        self.results = deque(maxlen=history)
+        self.epoch = 0
+        self.budget_overruns = 0
+        self.events = EventConsolidator(max_gap)
+
+    def score_epoch(self, epoch_signal):
+        start = time.perf_counter()
+        self.epoch += 1
+        features = extract_features_batch(epoch_signal, fs=self.fs)
+        labels, proba = self.model.predict(features)
+        label = int(labels[0])
+        proba = proba[0]
+        latency = time.perf_counter() - start
+        if latency > self.latency_budget_s:
+            self.budget_overruns += 1
+            print(f"Warning: epoch {self.epoch} took {latency:.3f}s (budget {self.latency_budget_s:.3f}s)")
+
+        result = {name: float(value) for name, value in zip(FEATURE_COLUMNS, features.iloc[0])}
+        result.update({
+            'epoch': self.epoch,
+            'predicted_label': label,
+            'predicted_label_str': LABEL_MAP[label],
+            'predicted_prob': float(proba[label]),
+            'latency_s': latency,
+            'events': self.events.update(self.epoch, label in ALERT_LABELS)
+        })
+        self.results.append(result)
+        return result
+
+    def feed(self, chunk):
+        """Push ECG samples; returns the results of every epoch completed by this chunk."""
+        return [self.score_epoch(epoch) for epoch in self.buffer.push(chunk)]
+
+    def flush(self):
+        """Close the open event at the end of the stream."""
+        return self.events.flush()
+
+
+def replay_file(npy_path, chunk_size=100, realtime=False, fs=100):
+    """Yield chunks of a saved ECG signal, optionally paced at the sampling rate."""
+    signal = np.load(npy_path, mmap_mode='r')
+    for start in range(0, len(signal), chunk_size):
+        yield np.asarray(signal[start:start + chunk_size])
+        if realtime:
+            time.sleep(chunk_size / fs)
+
+
+def socket_source(host='127.0.0.1', port=9000, chunk_size=100):
+    """Yield chunks of little-endian float32 samples read from a TCP connection until it closes."""
+    itemsize = np.dtype('<f4').itemsize
+    pending = b''
+    with socket.create_connection((host, port)) as conn:
+        while True:
+            data = conn.recv(chunk_size * itemsize)
+            if not data:
+                break
+            pending += data
+            usable = len(pending) - len(pending) % itemsize
+            if usable:
+                yield np.frombuffer(pending[:usable], dtype='<f4')
+                pending = pending[usable:]
+
+
+def run_stream(source, model=None, output_csv='data/combined/stream_predictions.csv', **monitor_kwargs):
+    """
+    Drive a monitor from a chunk source, appending one predictions row per epoch to output_csv
+    (same columns as features_advanced_predictions.csv, minus the true label).
+    """
+    monitor = StreamingApneaMonitor(model or load_model(), **monitor_kwargs)
+    columns = FEATURE_COLUMNS + ['epoch', 'predicted_label', 'predicted_label_str', 'predicted_prob']
+    os.makedirs(os.path.dirname(output_csv) or '.', exist_ok=True)
+    with open(output_csv, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for chunk in source:
+            for result in monitor.feed(chunk):
+                writer.writerow([result[c] for c in columns])
+                f.flush()  # make each epoch visible to readers of the file right away
+                for event in result['events']:
+                    if event['status'] != 'extended':
+                        print(f"Event {event['status']}: epochs {event['start_epoch']}-{event['end_epoch']}")
+    for event in monitor.flush():
+        print(f"Event {event['status']}: epochs {event['start_epoch']}-{event['end_epoch']}")
+    print(f"Streamed {monitor.epoch} epochs to {output_csv} ({monitor.budget_overruns} over latency budget)")
+    return monitor
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2:
+        print("Usage: python src/stream_inference.py <ecg_npy | host:port> [output_csv]")
+        exit(1)
+
+    target = sys.argv[1]
+    if target.endswith('.npy'):
+        source = replay_file(target)
+    else:
+        host, port = target.rsplit(':', 1)
+        source = socket_source(host, int(port))
+    if len(sys.argv) > 2:
+        run_stream(source, output_csv=sys.argv[2])
+    else:
+        run_stream(source)
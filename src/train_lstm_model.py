@@ -1,26 +1,9 @@
-import numpy as np
-import pandas as pd
 import torch
 import torch.nn as nn
-from torch.utils.data import Dataset, DataLoader
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
-from sklearn.utils.class_weight import compute_class_weight
-import torch.nn as nn
-
-class EpocSeqDataset(Dataset):
-    def __init__(self, sequences, labels):
-        self.sequences = sequences
-        self.labels = labels
-
-    def __len__(self):
-        return len(self.sequences)
-
-    def __getitem__(self, idx):
-        return {
-            'input': torch.tensor(self.sequences[idx], dtype=torch.float32),
-            'label': torch.tensor(self.labels[idx], dtype=torch.long)
-        }
+from feature_store import read_labeled
+from sequence_dataset import NON_FEATURE_COLUMNS, EpocSeqDataset, prepare_sequences, save_sequence_config, sequence_loader
+from cross_validation import holdout_split
 
 class LSTMModel(nn.Module):
     def __init__(self, input_dim, hidden_dim, output_dim, num_layers=1):
@@ -33,34 +16,25 @@ class LSTMModel(nn.Module):
         out = self.fc(out[:, -1, :])  # Use last time step
         return out
 
-def prepare_sequences(features_df, seq_length=5):
-    data = features_df.drop(columns=['label', 'epoch']).values
-    labels = features_df['label'].values
-    sequences = []
-    seq_labels = []
-
-    for i in range(len(data) - seq_length + 1):
-        seq = data[i:i+seq_length]
-        label = labels[i+seq_length-1]  # Label is aligned to last epoch in sequence
-        sequences.append(seq)
-        seq_labels.append(label)
-
-    return np.array(sequences), np.array(seq_labels)
-
-def train_lstm_model(features_csv='data/combined/features_multiclass.csv', seq_length=5, batch_size=32, epochs=20):
-    df = pd.read_csv(features_csv)
-    sequences, labels = prepare_sequences(df, seq_length)
+def train_lstm_model(records=None, seq_length=5, batch_size=32, epochs=20, num_workers=0):
+    # Features of all records in the feature store (or the given ones), labels joined at read time
+    df = read_labeled('features_multiclass', records=records)
+    data, starts, labels = prepare_sequences(df, seq_length)
 
-    X_train, X_val, y_train, y_val = train_test_split(sequences, labels, test_size=0.2, random_state=42)
+    # Split by record: overlapping windows of one record must not sit on both sides.
+    # Both datasets index the same feature matrix.
+    groups = df.sort_values(['record', 'epoch'], kind='stable')['record'].to_numpy()[starts]
+    train_idx, val_idx = holdout_split(groups)
+    start_train, start_val, y_train, y_val = starts[train_idx], starts[val_idx], labels[train_idx], labels[val_idx]
 
-    train_dataset = EpocSeqDataset(X_train, y_train)
-    val_dataset = EpocSeqDataset(X_val, y_val)
+    train_dataset = EpocSeqDataset(data, start_train, y_train, seq_length)
+    val_dataset = EpocSeqDataset(data, start_val, y_val, seq_length)
 
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True)
-    val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False)
+    train_loader = sequence_loader(train_dataset, batch_size, shuffle=True, num_workers=num_workers)
+    val_loader = sequence_loader(val_dataset, batch_size, shuffle=False, num_workers=num_workers)
 
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    model = LSTMModel(input_dim=X_train.shape[2], hidden_dim=64, output_dim=3).to(device)
+    model = LSTMModel(input_dim=data.shape[1], hidden_dim=64, output_dim=3).to(device)
     criterion = nn.CrossEntropyLoss()
     optimizer = torch.optim.Adam(model.parameters(), lr=0.001)
 
@@ -96,6 +70,8 @@ def train_lstm_model(features_csv='data/combined/features_multiclass.csv', seq_l
     print(classification_report(all_labels, all_preds, digits=4))
 
     torch.save(model.state_dict(), 'models/lstm_apnea_model.pth')
+    # The weights alone do not say which window length and feature order they expect
+    save_sequence_config('models/lstm_apnea_model.pth', seq_length, [c for c in df.columns if c not in NON_FEATURE_COLUMNS])
     print("LSTM model saved to models/lstm_apnea_model.pth")
 
 if __name__ == "__main__":
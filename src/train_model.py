@@ -7,6 +7,7 @@ from sklearn.metrics import classification_report, roc_curve, auc
 import matplotlib.pyplot as plt
 import os
 import joblib
+from predictor import save_feature_schema
 
 def train_and_evaluate(features_path='data/combined/features.csv', model_path='../models/apnea_model.pkl'):
     """
@@ -50,6 +51,7 @@ def train_and_evaluate(features_path='data/combined/features.csv', model_path='.
     # Save the trained model
     os.makedirs(os.path.dirname(model_path), exist_ok=True)
     joblib.dump(model, model_path)
+    save_feature_schema(model_path, X.columns)
     print(f"Model saved to {model_path}")
 
     return model
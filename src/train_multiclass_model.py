@@ -1,24 +1,19 @@
-import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report
 import joblib
+from predictor import save_feature_schema
+from cross_validation import evaluate, fit_model, labeled_matrix
 
-def train_multiclass_model(features_csv='data/combined/features_multiclass.csv', model_path='models/multiclass_rf_model.pkl'):
-    df = pd.read_csv(features_csv)
+def train_multiclass_model(records=None, model_path='models/multiclass_rf_model.pkl', n_splits=5, workers=None):
+    # Features of all records in the feature store (or the given ones), labels joined at read time
+    X, y, groups = labeled_matrix('features_multiclass', records)
 
-    X = df.drop(['label', 'epoch'], axis=1)
-    y = df['label']
+    # Grouped K-fold by record, so no record is scored by a model that saw its epochs
+    # (a single record falls back to a stratified holdout, with a warning)
+    evaluate(X, y, groups, 'rf', n_splits, smote=False, workers=workers, report_path='models/cv/multiclass_rf.json')
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-    clf = RandomForestClassifier(n_estimators=100, random_state=42)
-    clf.fit(X_train, y_train)
-
-    y_pred = clf.predict(X_test)
-    print(classification_report(y_test, y_pred, digits=4))
+    clf = fit_model('rf', X, y, smote=False, n_jobs=-1)
 
     joblib.dump(clf, model_path)
+    save_feature_schema(model_path, X.columns)
     print(f"Model saved to {model_path}")
 
 if __name__ == "__main__":
@@ -1,34 +1,26 @@
-import pandas as pd
-import numpy as np
-from imblearn.over_sampling import SMOTE
-from sklearn.model_selection import train_test_split
-from xgboost import XGBClassifier
-from sklearn.metrics import classification_report
 import joblib
+from predictor import save_feature_schema
+from model_registry import publish_model
+from cross_validation import evaluate, fit_model, labeled_matrix
 
-def train_xgboost_balanced(features_csv='data/combined/features_advanced.csv', model_path='models/xgboost_balanced_model.pkl'):
-    df = pd.read_csv(features_csv)
-    X = df.drop(['label', 'epoch'], axis=1)
-    y = df['label']
+def train_xgboost_balanced(records=None, model_path='models/xgboost_balanced_model.pkl', n_splits=5, workers=None):
+    # Features of all records in the feature store (or the given ones), labels joined at read time
+    X, y, groups = labeled_matrix('features', records)
 
-    # Apply SMOTE oversampling
-    smote = SMOTE(random_state=42)
-    X_res, y_res = smote.fit_resample(X, y)
+    # Grouped K-fold by record, SMOTE fitted inside each training fold, per-fold metrics and timings
+    # (a single record falls back to a stratified holdout, with a warning)
+    evaluate(X, y, groups, 'xgboost', n_splits, smote=True, workers=workers)
 
-    # Train-test split
-    X_train, X_test, y_train, y_test = train_test_split(X_res, y_res, test_size=0.2, random_state=42, stratify=y_res)
-
-    # XGBoost classifier
-    clf = XGBClassifier(use_label_encoder=False, eval_metric='mlogloss', random_state=42)
-    clf.fit(X_train, y_train)
-
-    # Predict and evaluate
-    y_pred = clf.predict(X_test)
-    print(classification_report(y_test, y_pred, digits=4))
+    # Final model: SMOTE and histogram XGBoost on every record
+    clf = fit_model('xgboost', X, y, smote=True, n_jobs=-1)
 
     # Save model
     joblib.dump(clf, model_path)
+    save_feature_schema(model_path, X.columns)
     print(f"Model saved to {model_path}")
 
+    # Versioned native-format copy that the API serves and hot-reloads
+    publish_model(clf, 'xgboost_balanced', X.columns)
+
 if __name__ == "__main__":
     train_xgboost_balanced()
@@ -1,8 +1,8 @@
-import pandas as pd
 import matplotlib.pyplot as plt
+from feature_store import read_table
 
-def visualize_apnea_events(consolidated_csv='data/consolidated_xgboost_alerts.csv', max_events=30):
-    df = pd.read_csv(consolidated_csv)
+def visualize_apnea_events(record='x01', max_events=30):
+    df = read_table('events', columns=['start_epoch', 'duration_epochs'], records=[record])
 
     df = df.head(max_events)
     df['duration_seconds'] = df['duration_epochs'] * 15  # 15 seconds per epoch
@@ -1,54 +1,25 @@
-import pandas as pd
+from event_consolidation import consolidate_events
+from feature_store import read_table, write_partition
 
-def consolidate_predictions(pred_csv='data/combined/features_advanced_predictions.csv',
+def consolidate_predictions(record='x01',
                             alert_labels=['Pre-apnea Warning', 'Apnea'],
-                            output_csv='data/consolidated_xgboost_alerts.csv',
                             max_gap=1):
     """
     Consolidate consecutive alert epochs into apnea events using model predictions.
     Params:
-      - pred_csv: CSV with model predictions including predicted_label_str and epoch columns
+      - record: record whose predictions partition (feature store) is consolidated
       - alert_labels: list of alert classes to group
-      - output_csv: file location for consolidated alert events
       - max_gap: max epoch gaps allowed within one event
     Returns:
-      - DataFrame of consolidated events with start, end, duration epochs
+      - DataFrame of consolidated events with start, end, duration epochs,
+        also stored as the record's events partition
     """
-    df = pd.read_csv(pred_csv)
-    
-    alert_df = df[df['predicted_label_str'].isin(alert_labels)].sort_values('epoch')
-    
-    events = []
-    current_start = None
-    current_end = None
-    
-    for _, row in alert_df.iterrows():
-        epoch = row['epoch']
-        
-        if current_start is None:
-            current_start = epoch
-            current_end = epoch
-        else:
-            if epoch <= current_end + max_gap:
-                current_end = epoch
-            else:
-                duration = current_end - current_start + 1
-                events.append({'start_epoch': current_start, 
-                               'end_epoch': current_end, 
-                               'duration_epochs': duration})
-                current_start = epoch
-                current_end = epoch
-    
-    # Append last event if exists
-    if current_start is not None:
-        duration = current_end - current_start + 1
-        events.append({'start_epoch': current_start, 
-                       'end_epoch': current_end, 
-                       'duration_epochs': duration})
-    
-    events_df = pd.DataFrame(events)
-    events_df.to_csv(output_csv, index=False)
-    print(f"Consolidated alerts saved to {output_csv}")
+    # Only the alert epochs are read; the label filter is applied while scanning
+    df = read_table('predictions', columns=['epoch'], records=[record],
+                    filters=[('predicted_label_str', 'in', list(alert_labels))])
+    events_df = consolidate_events(df['epoch'], max_gap)
+    path = write_partition(events_df, 'events', record)
+    print(f"Consolidated alerts saved to {path}")
     print(f"{len(events_df)} apnea events found")
     return events_df
 
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from advanced_feature_extraction import extract_features_batch
+from cross_validation import fit_model, oversample
+
+
+def features_with_a_flat_epoch():
+    rng = np.random.default_rng(0)
+    epochs = rng.standard_normal((60, 3000))
+    epochs[5] = 0.0  # lead-off: entropy, skewness and kurtosis are undefined
+    with pytest.warns(RuntimeWarning):
+        X = extract_features_batch(epochs).to_numpy(dtype=np.float32)
+    y = np.r_[np.zeros(40), np.ones(12), np.full(8, 2)].astype(np.int64)
+    return X, y
+
+
+def test_oversample_drops_undefined_rows(capsys):
+    X, y = features_with_a_flat_epoch()
+    assert np.isnan(X[5]).any()
+
+    X_res, y_res = oversample(X, y)
+
+    assert "Dropping 1 of 60 training rows" in capsys.readouterr().out
+    assert not np.isnan(X_res).any()
+    # Row 5 was a majority row: 39 left, every class oversampled to that
+    assert np.bincount(y_res).tolist() == [39, 39, 39]
+
+
+@pytest.mark.parametrize('model_name', ['xgboost', 'rf'])
+def test_fit_model_with_smote_and_undefined_rows(model_name):
+    X, y = features_with_a_flat_epoch()
+    model = fit_model(model_name, X, y, smote=True, n_estimators=10)
+    assert model.predict(X).shape == (60,)
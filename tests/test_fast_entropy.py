@@ -0,0 +1,53 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+antropy = pytest.importorskip('antropy')
+
+from fast_entropy import batch_entropy
+
+ATOL = 1e-8
+
+
+def ecg_like_epochs(n_epochs=16, n_samples=1500, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_samples)
+    epochs = np.stack([
+        np.sin(2 * np.pi * t / (60 + 5 * i)) + 4.0 * (t % (70 + i) == 0) + 0.2 * rng.standard_normal(n_samples)
+        for i in range(n_epochs)
+    ])
+    # Quantize like the raw PhysioNet signal so tied values are exercised too
+    return np.round(epochs / 0.005) * 0.005
+
+
+@pytest.mark.parametrize('order', [2, 3])
+def test_matches_antropy(order):
+    epochs = ecg_like_epochs()
+    # A small max_bytes splits the batch into several chunks
+    app_en, samp_en, failed = batch_entropy(epochs, order=order, max_bytes=1024 ** 2)
+
+    assert not failed.any()
+    np.testing.assert_allclose(app_en, [antropy.app_entropy(e, order=order) for e in epochs], rtol=0, atol=ATOL)
+    np.testing.assert_allclose(samp_en, [antropy.sample_entropy(e, order=order) for e in epochs], rtol=0, atol=ATOL)
+
+
+def test_undefined_entropy_is_flagged():
+    # Flat: r = 0. Distinct values further apart than r: no two templates match.
+    flat = np.full(10, 0.5)
+    no_matches = np.random.default_rng(1).permutation(np.arange(10.0))
+    defined = ecg_like_epochs(n_epochs=1, n_samples=10, seed=2)[0]
+    epochs = np.stack([flat, no_matches, defined])
+
+    app_en, samp_en, failed = batch_entropy(epochs)
+
+    assert failed.tolist() == [True, True, False]
+    assert np.isnan(app_en[:2]).all() and np.isnan(samp_en[:2]).all()
+    # antropy has no sample entropy for them either
+    with np.errstate(divide='ignore', invalid='ignore'):
+        assert not np.isfinite([antropy.sample_entropy(e, order=2) for e in (flat, no_matches)]).any()
+    np.testing.assert_allclose(app_en[2], antropy.app_entropy(defined, order=2), rtol=0, atol=ATOL)
+    np.testing.assert_allclose(samp_en[2], antropy.sample_entropy(defined, order=2), rtol=0, atol=ATOL)
@@ -0,0 +1,20 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from event_consolidation import consolidate_events
+from feature_store import read_table, write_partition
+
+
+def test_events_table_with_an_empty_partition(tmp_path):
+    # a00 has no alerts, so its events partition has no rows but must keep integer columns
+    write_partition(consolidate_events([], max_gap=1), 'events', 'a00', str(tmp_path))
+    write_partition(consolidate_events([3, 4, 9], max_gap=1), 'events', 'a01', str(tmp_path))
+
+    events = read_table('events', store_dir=str(tmp_path))
+
+    assert list(events['record']) == ['a01', 'a01']
+    assert list(events['start_epoch']) == [3, 9]
+    assert list(events['end_epoch']) == [4, 9]
+    assert list(events['duration_epochs']) == [2, 1]
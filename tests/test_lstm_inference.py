@@ -0,0 +1,79 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+torch = pytest.importorskip('torch')
+
+from lstm_inference import LSTMEngine, SequenceScorer
+
+
+def make_engine(bidirectional, seq_length=5, **session_options):
+    torch.manual_seed(0)
+    arch = {'input_dim': 7, 'hidden_dim': 16, 'output_dim': 3, 'num_layers': 2, 'bidirectional': bidirectional}
+    return LSTMEngine(SequenceScorer(**arch), arch, seq_length, **session_options)
+
+
+@pytest.mark.parametrize('bidirectional', [False, True])
+def test_streaming_matches_batch_scores(bidirectional):
+    engine = make_engine(bidirectional)
+    data = np.random.default_rng(0).normal(size=(30, 7)).astype(np.float32)
+
+    batch = engine.score_windows(data)
+    streamed = np.stack([engine.step(['p1'], row[np.newaxis])[0] for row in data])
+
+    assert np.isnan(streamed[:engine.seq_length - 1]).all()
+    np.testing.assert_allclose(streamed[engine.seq_length - 1:], batch, rtol=1e-5, atol=1e-6)
+
+
+def test_sessions_are_capped():
+    engine = make_engine(False, max_sessions=2)
+    row = np.zeros((1, 7), dtype=np.float32)
+    for session in ['a', 'b', 'c']:
+        engine.step([session], row)
+
+    assert list(engine.sessions) == ['b', 'c']
+    assert engine.evictions == 1
+
+
+def test_idle_sessions_expire():
+    now = [0.0]
+    engine = make_engine(False, session_ttl_s=10, clock=lambda: now[0])
+    engine.step(['a'], np.zeros((1, 7), dtype=np.float32))
+    now[0] = 10.0
+    engine.step(['b'], np.zeros((1, 7), dtype=np.float32))
+    assert list(engine.sessions) == ['a', 'b']
+
+    now[0] = 10.5
+    engine.step(['b'], np.zeros((1, 7), dtype=np.float32))
+    assert list(engine.sessions) == ['b']
+    assert engine.evictions == 1
+
+
+@pytest.mark.parametrize('bidirectional', [False, True])
+def test_quantized_export_matches_float_engine(tmp_path, bidirectional):
+    engine = make_engine(bidirectional)
+    data = np.random.default_rng(0).normal(size=(40, 7)).astype(np.float32)
+
+    path = engine.export(str(tmp_path / 'lstm.pt'), quantize=True)
+    exported = LSTMEngine.load(path)
+
+    assert exported.seq_length == engine.seq_length
+    assert exported.arch == engine.arch
+    assert exported.feature_names == engine.feature_names
+    # int8 weights: close to the float probabilities, not equal
+    np.testing.assert_allclose(exported.score_windows(data), engine.score_windows(data), atol=0.01)
+
+
+def test_score_frame_without_rows():
+    engine = make_engine(False)
+    frame = pd.DataFrame({'epoch': np.zeros(0, dtype=np.int64), **{f: np.zeros(0) for f in engine.feature_names}})
+
+    out = engine.score_frame(frame)
+
+    assert len(out) == 0
+    assert list(out.columns) == ['epoch', 'predicted_label', 'predicted_label_str', 'predicted_prob']